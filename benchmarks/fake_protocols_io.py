@@ -0,0 +1,152 @@
+"""
+Local stand-in for the protocols.io API serving every endpoint the tools use, with configurable latency and error injection.
+
+It is an httpx transport handler, so it can replace the network with helpers.open_client(httpx.MockTransport(api.handle)).
+"""
+import re
+import json
+import random
+import asyncio
+from collections import Counter
+from urllib.parse import parse_qs
+import httpx
+from protocols_io_mcp.tools.protocol import Material, Protocol, ProtocolStepInput
+import protocols_io_mcp.utils.helpers as helpers
+
+_WORDS = ["pcr", "dna", "rna", "extraction", "buffer", "sample", "incubate", "centrifuge", "wash", "elute", "cell", "culture", "staining", "lysis", "plasmid", "ligation"]
+_CREATED_ON = 1700000000
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+class FakeProtocolsIO:
+    """
+    In-memory protocols.io with generated public protocols and a user owning some of them.
+    Every request waits latency seconds, varied by up to jitter times latency, and fails with error_status at error_rate.
+    A slow_rate fraction of requests waits slow_factor times longer, making a latency tail.
+    """
+
+    def __init__(self, protocols: int = 200, steps: int = 30, owned: int = 20, latency: float = 0.05, jitter: float = 0.5, error_rate: float = 0.0, error_status: int = 503, slow_rate: float = 0.0, slow_factor: float = 20.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.username = "benchmark"
+        self.requests: Counter[str] = Counter()
+        self._rng = random.Random(seed)
+        self._protocols: dict[int, dict] = {}
+        self._steps: dict[int, list[dict]] = {}
+        self._owned: list[int] = []
+        for protocol_id in range(1, protocols + 1):
+            self._add_protocol(protocol_id, _text(self._rng, 5), _text(self._rng, 40), published=protocol_id > owned)
+        for protocol_id in self._protocols:
+            self._steps[protocol_id] = [self.new_step(protocol_id, index) for index in range(steps)]
+        self._owned = list(range(1, min(owned, protocols) + 1))
+        self._next_id = protocols + 1
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    @property
+    def owned_protocol_ids(self) -> list[int]:
+        return list(self._owned)
+
+    def new_step(self, protocol_id: int, index: int) -> dict:
+        """Generate a step in the format written by the tools, with a few materials and references."""
+        reference_ids = [(protocol_id + index) % len(self._protocols) + 1] if index % 5 == 0 else []
+        step = ProtocolStepInput(
+            description=f"{_text(self._rng, 12)}.\n{_text(self._rng, 8)}.",
+            materials=[Material(name=_text(self._rng, 2), quantity=self._rng.randint(1, 100) / 10, unit="mL") for _ in range(index % 4)],
+            reference_protocol_ids=reference_ids
+        )
+        references = {reference_id: Protocol.model_construct(**self._protocols[reference_id]) for reference_id in reference_ids}
+        return {"guid": f"{protocol_id:08x}{index:024x}", "step": ProtocolStepInput.to_string(step, references)}
+
+    def add_step(self, protocol_id: int) -> str:
+        """Append a step directly, without a request, and return its GUID."""
+        steps = self._steps[protocol_id]
+        step = self.new_step(protocol_id, len(steps))
+        step["guid"] = f"{self._rng.getrandbits(128):032x}"
+        steps.append(step)
+        return step["guid"]
+
+    def _add_protocol(self, protocol_id: int, title: str, description: str, published: bool) -> None:
+        self._protocols[protocol_id] = {
+            "id": protocol_id,
+            "title": title,
+            "description": description,
+            "doi": f"dx.doi.org/10.17504/protocols.io.{protocol_id}" if published else None,
+            "url": f"https://www.protocols.io/view/{protocol_id}",
+            "created_on": _CREATED_ON + protocol_id,
+            "published_on": _CREATED_ON + protocol_id if published else None
+        }
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix(httpx.URL(helpers.PROTOCOLS_IO_API_URL).path)
+        route = re.sub(r"/\d+|/[0-9a-f]{32}", "/{id}", path)
+        self.requests[f"{request.method} {route}"] += 1
+        if self.latency > 0:
+            slow = self.slow_rate > 0 and self._rng.random() < self.slow_rate
+            await asyncio.sleep(self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter)) * (self.slow_factor if slow else 1))
+        if self._rng.random() < self.error_rate:
+            return httpx.Response(self.error_status, json={"status_code": 1, "status_text": "Injected error", "error_message": "Injected error"}, headers={"Retry-After": "0"})
+        query = {key: values[0] for key, values in parse_qs(request.url.query.decode()).items()}
+        body = json.loads(request.content) if request.content else {}
+        result = self._dispatch(request.method, path, query, body)
+        if result is None:
+            return httpx.Response(404, json={"status_code": 1, "status_text": "Not found", "error_message": "Not found"})
+        return httpx.Response(200, json={"status_code": 0, **result})
+
+    def _dispatch(self, method: str, path: str, query: dict, body: dict) -> dict | None:
+        if method == "GET" and path == "/v3/protocols":
+            return self._search(query.get("key", ""), int(query.get("page_size", 10)), int(query.get("page_id", 0)))
+        if method == "GET" and path == "/v3/session/profile":
+            return {"user": {"username": self.username, "name": "Benchmark User", "affiliation": None}}
+        if method == "GET" and path == f"/v3/researchers/{self.username}/protocols":
+            return {"items": [self._protocols[protocol_id] for protocol_id in self._owned]}
+        if method == "POST" and re.fullmatch(r"/v3/protocols/[0-9a-f]{32}", path):
+            protocol_id = self._next_id
+            self._next_id += 1
+            self._add_protocol(protocol_id, "", "", published=False)
+            self._steps[protocol_id] = []
+            self._owned.append(protocol_id)
+            return {"protocol": {"id": protocol_id}}
+        match = re.fullmatch(r"/v4/protocols/(\d+)(/steps)?", path)
+        if match is None or int(match.group(1)) not in self._protocols:
+            return None
+        protocol_id = int(match.group(1))
+        if match.group(2) is None:
+            if method == "GET":
+                return {"payload": self._protocols[protocol_id]}
+            if method == "PUT":
+                self._protocols[protocol_id].update({key: body[key] for key in ("title", "description") if key in body})
+                return {}
+            return None
+        if method == "GET":
+            return {"payload": self._steps[protocol_id]}
+        if method == "POST":
+            self._write_steps(protocol_id, body.get("steps", []))
+            return {}
+        if method == "DELETE":
+            deleted = set(body.get("steps", []))
+            self._steps[protocol_id] = [step for step in self._steps[protocol_id] if step["guid"] not in deleted]
+            return {}
+        return None
+
+    def _search(self, keyword: str, page_size: int, page_id: int) -> dict:
+        terms = keyword.lower().split()
+        matches = [protocol for protocol in self._protocols.values() if protocol["published_on"] and all(term in protocol["title"] or term in protocol["description"] for term in terms)]
+        total_pages = max(1, -(-len(matches) // page_size))
+        items = matches[page_id * page_size:(page_id + 1) * page_size]
+        return {"items": items, "pagination": {"current_page": page_id + 1, "total_pages": total_pages}}
+
+    def _write_steps(self, protocol_id: int, steps: list[dict]) -> None:
+        """Insert or move each step after its previous_guid, replacing the content of existing GUIDs."""
+        current = self._steps[protocol_id]
+        for step in steps:
+            current[:] = [existing for existing in current if existing["guid"] != step["guid"]]
+            previous = next((index for index, existing in enumerate(current) if existing["guid"] == step.get("previous_guid")), -1)
+            current.insert(previous + 1, {"guid": step["guid"], "step": step["step"]})
@@ -0,0 +1,41 @@
+"""
+Micro-benchmark of ProtocolStep parsing on a large protocol.
+
+    python benchmarks/parse_steps.py --steps 5000
+"""
+import time
+import click
+from protocols_io_mcp.tools.protocol import Material, Protocol, ProtocolStep, ProtocolStepInput
+
+def build_payload(steps: int) -> list[dict]:
+    references = {
+        protocol_id: Protocol.model_construct(id=protocol_id, title=f"Referenced protocol {protocol_id}", doi=f"dx.doi.org/10.17504/protocols.io.{protocol_id}")
+        for protocol_id in range(1, 6)
+    }
+    payload = []
+    for index in range(steps):
+        step = ProtocolStepInput(
+            description=f"Step {index}: mix the sample gently and incubate.\nKeep on ice between steps.",
+            materials=[Material(name=f"Reagent {material}", quantity=material + 0.5, unit="mL") for material in range(index % 6)],
+            reference_protocol_ids=[protocol_id for protocol_id in references if (index + protocol_id) % 3 == 0]
+        )
+        payload.append({"guid": f"{index:032x}", "step": ProtocolStepInput.to_string(step, references)})
+    return payload
+
+@click.command()
+@click.option("--steps", default=5000, help="Number of steps in the protocol [default: 5000]")
+@click.option("--repeat", default=5, help="Number of timed runs, the best one is reported [default: 5]")
+def main(steps: int, repeat: int):
+    """Time ProtocolStep.from_api_response over a generated protocol."""
+    payload = build_payload(steps)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parsed = [ProtocolStep.from_api_response(step) for step in payload]
+        timings.append(time.perf_counter() - started)
+    assert len(parsed) == steps
+    best = min(timings)
+    print(f"parsed {steps} steps in {best * 1000:.1f} ms ({steps / best:,.0f} steps/s, best of {repeat})")
+
+if __name__ == "__main__":
+    main()
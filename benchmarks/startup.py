@@ -0,0 +1,55 @@
+"""
+Time-to-first-list_tools of a fresh stdio server process, as started by MCP desktop clients for every session.
+
+    python benchmarks/startup.py --runs 5 --budget 3.0
+"""
+import sys
+import json
+import time
+import asyncio
+import statistics
+import subprocess
+import click
+from fastmcp import Client
+from fastmcp.client.transports import StdioTransport
+
+def time_import(module: str) -> float:
+    """Time importing module in a fresh interpreter."""
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    return float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+
+async def time_list_tools() -> tuple[float, int]:
+    """Start a stdio server and return the seconds until its tools are listed, and how many there are."""
+    started = time.perf_counter()
+    async with Client(StdioTransport(command=sys.executable, args=["-m", "protocols_io_mcp"], keep_alive=False)) as client:
+        tools = await client.list_tools()
+        return time.perf_counter() - started, len(tools)
+
+@click.command()
+@click.option("--runs", default=5, help="Number of server starts [default: 5]")
+@click.option("--budget", default=None, type=float, help="Fail if the median time to the first list_tools exceeds this many seconds")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results as JSON to this file")
+def main(runs: int, budget: float | None, output: str | None):
+    """Time the startup of the stdio server until its first list_tools response."""
+    imports = {module: min(time_import(module) for _ in range(runs)) for module in ("fastmcp", "protocols_io_mcp.server")}
+    timings = []
+    for _ in range(runs):
+        seconds, tools = asyncio.run(time_list_tools())
+        timings.append(seconds)
+    result = {
+        "runs": runs,
+        "tools": tools,
+        "import_seconds": imports,
+        "list_tools_seconds": {"min": min(timings), "median": statistics.median(timings), "max": max(timings)},
+        "budget_seconds": budget
+    }
+    print(f"import fastmcp: {imports['fastmcp'] * 1000:.0f} ms, import server and tools: {imports['protocols_io_mcp.server'] * 1000:.0f} ms")
+    print(f"first list_tools ({tools} tools): min {min(timings) * 1000:.0f} ms, median {statistics.median(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms")
+    if output:
+        with open(output, "w") as file:
+            json.dump(result, file, indent=2)
+    if budget is not None and statistics.median(timings) > budget:
+        raise click.ClickException(f"median time to the first list_tools exceeds the budget of {budget:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark of every tool against a local protocols.io stand-in, driven through fastmcp.Client with concurrent clients.
+
+    python benchmarks/tools.py --clients 8 --calls 20 --latency 0.05 --output results.json
+
+For each tool, reports p50/p99 latency, upstream requests per call and throughput. Each tool starts with an empty response cache.
+"""
+import json
+import time
+import asyncio
+import platform
+import subprocess
+from typing import Any, Callable
+import click
+import httpx
+from fastmcp import Client
+from fake_protocols_io import FakeProtocolsIO
+from protocols_io_mcp.server import mcp
+from protocols_io_mcp.utils.cache import TTLCache
+from protocols_io_mcp.utils.ratelimit import TokenBucket
+import protocols_io_mcp.utils.helpers as helpers
+
+def _step(index: int) -> dict:
+    return {
+        "description": f"Incubate the sample for {index} minutes and wash with buffer.",
+        "materials": [{"name": "wash buffer", "quantity": 1.5, "unit": "mL"}] if index % 2 else [],
+        "reference_protocol_ids": [100 + index % 5] if index % 3 == 0 else []
+    }
+
+# arguments of each benchmarked tool for the i-th call, in the order the tools are run
+SCENARIOS: dict[str, Callable[[FakeProtocolsIO, int], dict[str, Any]]] = {
+    "search_public_protocols": lambda api, i: {"keyword": ["pcr", "dna buffer", "cell culture", "lysis"][i % 4], "page_size": 5},
+    "get_protocol": lambda api, i: {"protocol_id": 30 + i % 100},
+    "get_protocol_steps": lambda api, i: {"protocol_id": 30 + i % 100},
+    "get_protocols_batch": lambda api, i: {"protocol_ids": [30 + (i * 5 + offset) % 100 for offset in range(5)]},
+    "get_protocol_steps_batch": lambda api, i: {"protocol_ids": [30 + (i * 5 + offset) % 100 for offset in range(5)], "summary": True},
+    "search_local_protocols": lambda api, i: {"query": ["pcr buffer", "incubate sample", "plasmid ligation"][i % 3]},
+    "get_my_protocols": lambda api, i: {},
+    "create_protocol": lambda api, i: {"title": f"Benchmark protocol {i}", "description": "Created by the benchmark"},
+    "update_protocol_title": lambda api, i: {"protocol_id": api.owned_protocol_ids[i % 10], "title": f"Title {i}"},
+    "update_protocol_description": lambda api, i: {"protocol_id": api.owned_protocol_ids[i % 10], "description": f"Description {i}"},
+    "set_protocol_steps": lambda api, i: {"protocol_id": api.owned_protocol_ids[10 + i % 5], "steps": [_step(index + i % 3) for index in range(10)]},
+    "add_protocol_step": lambda api, i: {"protocol_id": api.owned_protocol_ids[15 + i % 5], "step": _step(i)},
+    "delete_protocol_step": lambda api, i: {"protocol_id": api.owned_protocol_ids[15 + i % 5], "step_id": api.add_step(api.owned_protocol_ids[15 + i % 5])},
+}
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values) + 0.5) - 1))]
+
+def _is_error(result: Any) -> bool:
+    if result.is_error:
+        return True
+    content = (result.structured_content or {}).get("result")
+    items = content if isinstance(content, list) else [content]
+    return any(isinstance(item, dict) and "error_message" in item for item in items)
+
+async def _call(client: Client, tool: str, arguments: dict, latencies: list[float]) -> bool:
+    started = time.perf_counter()
+    result = await client.call_tool(tool, arguments, raise_on_error=False)
+    latencies.append(time.perf_counter() - started)
+    return _is_error(result)
+
+async def run_tool(api: FakeProtocolsIO, clients: list[Client], tool: str, calls: int) -> dict[str, Any]:
+    """Run calls calls of the tool on every client concurrently and summarize them."""
+    helpers.response_cache.clear()
+    helpers.private_cache.clear()
+    requests_before = api.total_requests
+    latencies: list[float] = []
+    async def drive(client_index: int, client: Client) -> int:
+        errors = 0
+        for call in range(calls):
+            errors += await _call(client, tool, SCENARIOS[tool](api, client_index * calls + call), latencies)
+        return errors
+    started = time.perf_counter()
+    errors = sum(await asyncio.gather(*(drive(index, client) for index, client in enumerate(clients))))
+    elapsed = time.perf_counter() - started
+    # let prefetches finish so their requests are counted for the tool that started them
+    await asyncio.gather(*helpers._background_tasks, return_exceptions=True)
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "upstream_requests_per_call": (api.total_requests - requests_before) / len(latencies),
+        "throughput_per_s": len(latencies) / elapsed,
+        "cache": helpers.response_cache.stats()
+    }
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(api: FakeProtocolsIO, tools: list[str], clients: int, calls: int) -> dict[str, dict[str, Any]]:
+    helpers.open_client(httpx.MockTransport(api.handle))
+    sessions = [Client(mcp) for _ in range(clients)]
+    for session in sessions:
+        await session.__aenter__()
+    try:
+        return {tool: await run_tool(api, sessions, tool, calls) for tool in tools}
+    finally:
+        for session in sessions:
+            await session.__aexit__(None, None, None)
+
+@click.command()
+@click.option("--clients", default=4, help="Number of concurrent MCP clients [default: 4]")
+@click.option("--calls", default=10, help="Number of calls of each tool per client [default: 10]")
+@click.option("--tool", "tools", multiple=True, type=click.Choice(list(SCENARIOS)), help="Tool to benchmark, can be repeated [default: all tools]")
+@click.option("--latency", default=0.05, help="Mean upstream latency in seconds [default: 0.05]")
+@click.option("--jitter", default=0.5, help="Upstream latency variation as a fraction of the latency [default: 0.5]")
+@click.option("--error-rate", default=0.0, help="Fraction of upstream requests failing with --error-status [default: 0.0]")
+@click.option("--error-status", default=503, help="HTTP status of injected errors [default: 503]")
+@click.option("--slow-rate", default=0.0, help="Fraction of upstream requests 20 times slower than --latency [default: 0.0]")
+@click.option("--cache/--no-cache", default=True, help="Keep the in-memory response cache enabled [default: enabled]")
+@click.option("--rate-limit/--no-rate-limit", default=False, help="Apply the configured client-side rate limit [default: disabled]")
+@click.option("--hedge/--no-hedge", default=False, help="Hedge slow GETs like PROTOCOLS_IO_HEDGE_GETS=true [default: disabled]")
+@click.option("--seed", default=0, help="Seed of the generated data, latencies and errors [default: 0]")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results as JSON to this file")
+def main(clients: int, calls: int, tools: tuple[str, ...], latency: float, jitter: float, error_rate: float, error_status: int, slow_rate: float, cache: bool, rate_limit: bool, hedge: bool, seed: int, output: str | None):
+    """Benchmark the tools against a local protocols.io stand-in."""
+    api = FakeProtocolsIO(latency=latency, jitter=jitter, error_rate=error_rate, error_status=error_status, slow_rate=slow_rate, seed=seed)
+    if not cache:
+        helpers.response_cache = TTLCache(0, 0)
+        helpers.private_cache = TTLCache(0, 0)
+    if not rate_limit:
+        helpers.rate_limiter = TokenBucket(rate=0, burst=1)
+    helpers.PROTOCOLS_IO_HEDGE_GETS = hedge
+    tools = list(tools) or list(SCENARIOS)
+    results = asyncio.run(run(api, tools, clients, calls))
+    print(f"{'tool':<28}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'req/call':>10}{'calls/s':>10}")
+    for tool, result in results.items():
+        print(f"{tool:<28}{result['calls']:>7}{result['errors']:>8}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['upstream_requests_per_call']:>10.2f}{result['throughput_per_s']:>10.1f}")
+    if output:
+        report = {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "config": {"clients": clients, "calls": calls, "latency": latency, "jitter": jitter, "error_rate": error_rate, "error_status": error_status, "slow_rate": slow_rate, "cache": cache, "rate_limit": rate_limit, "hedge": hedge, "seed": seed},
+            "upstream_requests": dict(api.requests),
+            "tools": results
+        }
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
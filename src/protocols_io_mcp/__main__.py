@@ -1,13 +1,37 @@
+import os
 import click
-from protocols_io_mcp.server import mcp
 
 @click.command()
 @click.option("--transport", default="stdio", type=click.Choice(['stdio', 'http', 'sse']), help="Transport protocol to use [default: stdio]")
 @click.option("--host", default="127.0.0.1", help="Host to bind to when using http and sse transport [default: 127.0.0.1]")
 @click.option("--port", default=8000, help="Port to bind to when using http and sse transport [default: 8000]")
-def main(transport: str, host: str, port: int):
+@click.option("--cache-dir", default=None, envvar="PROTOCOLS_IO_CACHE_DIR", type=click.Path(file_okay=False), help="Directory for a persistent cache of published protocols shared across restarts [default: disabled]")
+@click.option("--metrics/--no-metrics", default=False, envvar="PROTOCOLS_IO_METRICS", help="Record metrics, served at /metrics with the http and sse transports and as the metrics://protocols-io resource [default: disabled]")
+@click.option("--workers", default=1, type=click.IntRange(min=1), envvar="PROTOCOLS_IO_WORKERS", help="Number of worker processes serving the http transport, more than 1 implies --stateless-http [default: 1]")
+@click.option("--stateless-http/--no-stateless-http", default=False, envvar="PROTOCOLS_IO_STATELESS_HTTP", help="Serve the http transport without sessions, so that any worker can answer any request [default: disabled]")
+@click.option("--caller-tokens/--no-caller-tokens", default=False, envvar="PROTOCOLS_IO_CALLER_TOKENS", help="Access protocols.io with the bearer token of each http and sse request instead of PROTOCOLS_IO_CLIENT_ACCESS_TOKEN, keeping each caller's private data apart [default: disabled]")
+def main(transport: str, host: str, port: int, cache_dir: str | None, metrics: bool, workers: int, stateless_http: bool, caller_tokens: bool):
     """Run the protocols.io MCP server."""
+    if caller_tokens and transport == "stdio":
+        raise click.UsageError("--caller-tokens requires --transport http or sse")
+    if workers > 1 or stateless_http:
+        if transport != "http":
+            raise click.UsageError("--workers and --stateless-http require --transport http")
+        print(f"Starting protocols.io MCP server with {workers} stateless worker(s)...")
+        # workers are separate processes that configure themselves from the environment in create_app
+        os.environ.update({"PROTOCOLS_IO_WORKERS": str(workers), "PROTOCOLS_IO_METRICS": str(metrics).lower(), "PROTOCOLS_IO_CALLER_TOKENS": str(caller_tokens).lower()})
+        if cache_dir:
+            os.environ["PROTOCOLS_IO_CACHE_DIR"] = cache_dir
+        import uvicorn
+        uvicorn.run("protocols_io_mcp.app:create_app", factory=True, host=host, port=port, workers=workers, timeout_graceful_shutdown=0)
+        return
     print("Starting protocols.io MCP server...")
+    # imported here so that --help does not load the server and its tools
+    from protocols_io_mcp.server import mcp
+    from protocols_io_mcp.utils import helpers
+    helpers.configure_disk_cache(cache_dir)
+    helpers.metrics.enabled = metrics
+    helpers.caller_tokens = caller_tokens
     if transport == "stdio":
         mcp.run(transport=transport)
     else:
@@ -0,0 +1,26 @@
+import os
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from protocols_io_mcp.server import mcp
+from protocols_io_mcp.utils import helpers
+
+def create_app() -> Starlette:
+    """
+    Build the stateless HTTP app of one worker process, configured from the environment set by the CLI.
+    Uvicorn calls this factory in every worker started with --workers.
+    """
+    helpers.configure_disk_cache(os.getenv("PROTOCOLS_IO_CACHE_DIR"))
+    helpers.metrics.enabled = os.getenv("PROTOCOLS_IO_METRICS", "false").lower() in ("1", "true", "yes", "on")
+    helpers.caller_tokens = os.getenv("PROTOCOLS_IO_CALLER_TOKENS", "false").lower() in ("1", "true", "yes", "on")
+    helpers.configure_workers(int(os.getenv("PROTOCOLS_IO_WORKERS", "1")))
+    app = mcp.http_app(transport="http", stateless_http=True)
+    session_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        # every stateless request is a session of its own, so hold the shared HTTP client for the life of the worker
+        async with helpers.lifespan(mcp), session_lifespan(app):
+            yield
+
+    app.router.lifespan_context = lifespan
+    return app
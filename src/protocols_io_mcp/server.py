@@ -1,10 +1,92 @@
+import time
+import asyncio
 import importlib
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_http_headers
+from fastmcp.server.middleware import Middleware
+from mcp import McpError
+from mcp.types import INVALID_REQUEST, ErrorData
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from protocols_io_mcp import tool_schemas
+from protocols_io_mcp.utils import helpers
+from protocols_io_mcp.utils.metrics import COUNT_BUCKETS
+
+class ToolMetricsMiddleware(Middleware):
+    """Record the duration, outcome and number of upstream requests of every tool call while metrics are enabled."""
+
+    async def on_call_tool(self, context, call_next):
+        if not helpers.metrics.enabled:
+            return await call_next(context)
+        tool = context.message.name
+        upstream_requests = helpers.metrics.start_tool_call()
+        started = time.perf_counter()
+        outcome = "exception"
+        try:
+            result = await call_next(context)
+            content = (result.structured_content or {}).get("result")
+            outcome = "error" if isinstance(content, dict) and "error_message" in content else "ok"
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            helpers.metrics.observe("protocols_io_tool_duration_seconds", time.perf_counter() - started, tool=tool)
+            helpers.metrics.observe("protocols_io_tool_upstream_requests", upstream_requests[0], buckets=COUNT_BUCKETS, tool=tool)
+            helpers.metrics.increment("protocols_io_tool_calls_total", tool=tool, outcome=outcome)
+
+class CallerTokenMiddleware(Middleware):
+    """
+    Send the upstream requests of an MCP request with the bearer token it carries, when caller tokens are enabled.
+    Requests without one are rejected, so that they cannot act with the server's own access token.
+    """
+
+    async def on_request(self, context, call_next):
+        if not helpers.caller_tokens:
+            return await call_next(context)
+        authorization = get_http_headers(include_all=True).get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        token = token.strip() if scheme.lower() == "bearer" else ""
+        if not token:
+            raise McpError(ErrorData(code=INVALID_REQUEST, message="A protocols.io access token is required in an 'Authorization: Bearer <token>' header"))
+        with helpers.caller_token(token):
+            return await call_next(context)
+
+class DeadlineMiddleware(Middleware):
+    """
+    Give the upstream requests of every tool call PROTOCOLS_IO_TOOL_TIMEOUT seconds, so that one slow request cannot stall it.
+    When the client cancels a call, its task is cancelled and so are the upstream requests only it was waiting for.
+    """
+
+    async def on_call_tool(self, context, call_next):
+        with helpers.deadline(helpers.PROTOCOLS_IO_TOOL_TIMEOUT):
+            return await call_next(context)
 
 mcp = FastMCP(
     name="protocols-io-mcp",
     instructions="""
         This server helps you interact with data from protocols.io.
-    """
+    """,
+    lifespan=helpers.lifespan
 )
-importlib.import_module('protocols_io_mcp.tools')
\ No newline at end of file
+mcp.add_middleware(CallerTokenMiddleware())
+mcp.add_middleware(ToolMetricsMiddleware())
+mcp.add_middleware(DeadlineMiddleware())
+_tool_schemas = tool_schemas.load()
+
+def tool(fn):
+    """Register fn as a tool like mcp.tool(), reusing its precomputed schemas to keep startup fast."""
+    return tool_schemas.register(mcp, fn, _tool_schemas)
+
+@mcp.custom_route("/metrics", methods=["GET"], include_in_schema=False)
+async def prometheus_metrics(request: Request) -> PlainTextResponse:
+    """Prometheus endpoint, served with the http and sse transports."""
+    if not helpers.metrics.enabled:
+        return PlainTextResponse("Metrics are disabled, start the server with --metrics to enable them.\n", status_code=404)
+    return PlainTextResponse(helpers.metrics.render(helpers.metrics_gauges()), media_type="text/plain; version=0.0.4")
+
+@mcp.resource("metrics://protocols-io", name="metrics", description="Tool, upstream request, parsing and cache metrics of this server", mime_type="application/json")
+def metrics_resource() -> dict:
+    return helpers.metrics.snapshot(helpers.metrics_gauges())
+
+importlib.import_module('protocols_io_mcp.tools')
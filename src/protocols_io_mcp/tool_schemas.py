@@ -0,0 +1,73 @@
+import os
+import json
+import asyncio
+import hashlib
+import importlib
+import pydantic
+import fastmcp
+from typing import Any
+from fastmcp.tools.tool import FunctionTool
+import protocols_io_mcp.utils.helpers as helpers
+
+TOOLS_DIR = os.path.join(os.path.dirname(__file__), "tools")
+SCHEMAS_PATH = os.path.join(TOOLS_DIR, "schemas.json")
+# settings that appear in the parameter descriptions of the tools
+SCHEMA_SETTINGS = ("PROTOCOLS_IO_SEARCH_MAX_PAGE_SIZE", "PROTOCOLS_IO_SEARCH_MAX_PAGES", "PROTOCOLS_IO_MAX_BATCH_SIZE")
+
+def _major(version: str) -> str:
+    return version.split(".", 1)[0]
+
+def fingerprint() -> str:
+    """
+    Hash the inputs of the schemas: the tool modules, the settings quoted in parameter descriptions and the major versions of fastmcp and pydantic.
+    Minor releases are left out so that installs resolving newer ones still use the precomputed schemas, test_tool_schemas checks they generate the same output.
+    """
+    digest = hashlib.sha256(f"fastmcp {_major(fastmcp.__version__)} pydantic {_major(pydantic.VERSION)}".encode())
+    digest.update(json.dumps({name: getattr(helpers, name) for name in SCHEMA_SETTINGS}).encode())
+    for name in sorted(os.listdir(TOOLS_DIR)):
+        if name.endswith(".py"):
+            with open(os.path.join(TOOLS_DIR, name), "rb") as file:
+                digest.update(name.encode() + b"\0" + file.read())
+    return digest.hexdigest()
+
+def load(path: str = SCHEMAS_PATH) -> dict[str, dict[str, Any]]:
+    """
+    Return the precomputed schemas by tool name, so that startup does not have to generate them from the models.
+    Nothing is returned if they are missing or stale, and tools are then registered as usual.
+    """
+    try:
+        with open(path) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return cached.get("tools", {}) if cached.get("fingerprint") == fingerprint() else {}
+
+def register(mcp: fastmcp.FastMCP, fn: Any, schemas: dict[str, dict[str, Any]]) -> FunctionTool:
+    """Register fn as a tool of mcp, taking its schemas from schemas when they are there."""
+    cached = schemas.get(fn.__name__)
+    if cached is None:
+        return mcp.tool(fn)
+    tool = FunctionTool(fn=fn, name=fn.__name__, description=cached["description"], parameters=cached["parameters"], output_schema=cached["output_schema"])
+    mcp.add_tool(tool)
+    return tool
+
+async def generate(mcp: fastmcp.FastMCP) -> dict[str, dict[str, Any]]:
+    """Generate the schemas of every registered tool from its function, ignoring precomputed ones."""
+    tools = await mcp.get_tools()
+    schemas = {}
+    for name, tool in sorted(tools.items()):
+        generated = FunctionTool.from_function(tool.fn)
+        schemas[name] = {"description": generated.description, "parameters": generated.parameters, "output_schema": generated.output_schema}
+    return schemas
+
+def main() -> None:
+    """Regenerate the precomputed schemas, to be run after changing a tool or a model: python -m protocols_io_mcp.tool_schemas"""
+    mcp = importlib.import_module("protocols_io_mcp.server").mcp
+    schemas = asyncio.run(generate(mcp))
+    with open(SCHEMAS_PATH, "w") as file:
+        json.dump({"fingerprint": fingerprint(), "tools": schemas}, file, indent=1, sort_keys=True)
+        file.write("\n")
+    print(f"Wrote the schemas of {len(schemas)} tools to {SCHEMAS_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
+import re
 import uuid
+import asyncio
+import difflib
 from datetime import datetime, timezone
+from urllib.parse import urlencode
 from typing import Annotated
 from pydantic import BaseModel, Field
-from protocols_io_mcp.server import mcp
+from protocols_io_mcp.server import tool
 import protocols_io_mcp.utils.helpers as helpers
+import protocols_io_mcp.utils.concurrency as concurrency
 
 class User(BaseModel):
     username: Annotated[str, Field(description="Unique identifier for the user")]
@@ -23,13 +28,33 @@ class Material(BaseModel):
     quantity: Annotated[float, Field(description="Amount of material needed", ge=0.0)]
     unit: Annotated[str, Field(description="Unit of measurement for the material, e.g., 'mL', 'g', 'μL'")]
 
+# ID of a referenced protocol in a "- Title[ID] DOI" line
+_REFERENCE_ID_PATTERN = re.compile(r"\[(\d+)\]")
+
+def _truncate(text: str, max_length: int | None) -> str:
+    if max_length is None or len(text) <= max_length:
+        return text
+    # the ellipsis counts towards max_length
+    return text[:max_length - 1].rstrip() + "…"
+
 class ProtocolStepInput(BaseModel):
     description: Annotated[str, Field(description="Description of the step (plain text only)")]
     materials: Annotated[list[Material], Field(description="Materials required for this step. Empty if no materials are needed")] = Field(default_factory=list)
     reference_protocol_ids: Annotated[list[int], Field(description="Protocol IDs referenced by this step. Empty if no references exist. Strongly recommend using at least one reference to ensure credibility")] = Field(default_factory=list)
 
     @staticmethod
-    async def to_string(step: "ProtocolStepInput") -> str:
+    async def resolve_references(steps: list["ProtocolStepInput"]) -> "dict[int, Protocol] | ErrorMessage":
+        """Fetch every protocol referenced by the steps once, concurrently. All invalid references are reported in a single error."""
+        protocol_ids = list(dict.fromkeys(protocol_id for step in steps for protocol_id in step.reference_protocol_ids))
+        protocols = await Protocol.from_protocol_ids(protocol_ids)
+        errors = [protocol.error_message for protocol in protocols if isinstance(protocol, ErrorMessage)]
+        if errors:
+            return ErrorMessage.from_string(f"Invalid reference protocols: {'; '.join(errors)}")
+        return dict(zip(protocol_ids, protocols))
+
+    @staticmethod
+    def to_string(step: "ProtocolStepInput", references: "dict[int, Protocol]") -> str:
+        """Render the step content, taking referenced protocols from the map built by resolve_references."""
         step_content = f"{step.description}\n"
         if len(step.materials) + len(step.reference_protocol_ids) > 0:
             step_content += "\n"
@@ -44,11 +69,7 @@ class ProtocolStepInput(BaseModel):
                 step_content += "\n"
             step_content += "[Protocol References]\n"
             for protocol_id in step.reference_protocol_ids:
-                # get information about the referenced protocol
-                response_get_protocol = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}")
-                if response_get_protocol["status_code"] != 0:
-                    return response_get_protocol["status_text"]
-                protocol = await Protocol.from_protocol_id(response_get_protocol["payload"]["id"])
+                protocol = references[protocol_id]
                 step_content += f"- {protocol.title.replace('[', '<').replace(']', '>')}[{protocol.id}] {protocol.doi}\n"
         return step_content
 
@@ -59,55 +80,154 @@ class ProtocolStep(BaseModel):
     reference_protocol_ids: Annotated[list[int], Field(description="Protocol IDs referenced by this step. Empty if no references exist or if source data could not be parsed")] = Field(default_factory=list)
 
     @staticmethod
+    @helpers.metrics.timed("protocols_io_step_parse")
     def parse(step: str) -> dict:
+        """
+        Parse step content written by ProtocolStepInput.to_string in a single pass.
+        Materials are returned as plain dicts so that the step model validates them once, and malformed material or reference lines are skipped instead of failing the whole step.
+        """
         description = []
         materials = []
         reference_protocol_ids = []
-        material_flag = False
-        reference_flag = False
+        section = None
         for line in step.splitlines():
-            if material_flag is False and reference_flag is False:
-                if line == "[Materials]":
-                    material_flag = True
-                    reference_flag = False
-                elif line == "[Protocol References]":
-                    reference_flag = True
-                    material_flag = False
-                elif len(line) > 0:
-                    description.append(line)
-            elif material_flag:
-                if len(line) == 0 or line[0] != '-':
-                    material_flag = False
+            if section is not None:
+                if line[:1] == "-":
+                    if section == "materials":
+                        data = line.split()
+                        if len(data) >= 4:
+                            try:
+                                quantity = float(data[2])
+                            except ValueError:
+                                continue
+                            if quantity >= 0.0:
+                                materials.append({"name": data[1], "quantity": quantity, "unit": data[3]})
+                    else:
+                        match = _REFERENCE_ID_PATTERN.search(line)
+                        if match:
+                            reference_protocol_ids.append(int(match.group(1)))
                     continue
-                data = line.split()
-                materials.append(Material(
-                    name=data[1],
-                    quantity=float(data[2]),
-                    unit=data[3]
-                ))
-            elif reference_flag:
-                if len(line) == 0 or line[0] != '-':
-                    reference_flag = False
+                section = None
+                if not line:
                     continue
-                data = line.split("[")[1].split("]")[0]
-                reference_protocol_ids.append(int(data))
-        description = "\n".join(description)
+            if line == "[Materials]":
+                section = "materials"
+            elif line == "[Protocol References]":
+                section = "references"
+            elif line:
+                description.append(line)
         return {
-            "description": description,
+            "description": "\n".join(description),
             "materials": materials,
             "reference_protocol_ids": reference_protocol_ids
         }
 
     @classmethod
     def from_api_response(cls, data: dict) -> "ProtocolStep":
-        parsed_step = ProtocolStep.parse(data["step"])
-        return cls(
-            id=data["guid"],
-            description=parsed_step["description"],
-            materials=parsed_step["materials"],
-            reference_protocol_ids=parsed_step["reference_protocol_ids"]
+        return cls(id=data["guid"], **ProtocolStep.parse(data.get("step") or ""))
+
+    @classmethod
+    async def from_protocol_id(cls, protocol_id: int) -> list["ProtocolStep"]:
+        response = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}/steps?content_format=markdown")
+        if response["status_code"] != 0:
+            raise ValueError(response["status_text"])
+        steps = [cls.from_api_response(step) for step in response.get("payload", [])]
+        cls.index(protocol_id, steps, replace=True)
+        return steps
+
+    @staticmethod
+    def index(protocol_id: int, steps: list["ProtocolStep"], replace: bool = False) -> None:
+        """Add steps to the local full-text index, replace marks them as the complete list of steps of the protocol."""
+        helpers.current_search_index().add_steps(
+            protocol_id,
+            [(step.id, " ".join([step.description, *(material.name for material in step.materials)])) for step in steps],
+            replace
         )
 
+    def content_key(self) -> tuple:
+        """Key identifying the content of the step, independent of its ID and of how referenced protocols are titled."""
+        return (
+            self.description,
+            tuple((material.name, material.quantity, material.unit) for material in self.materials),
+            tuple(self.reference_protocol_ids)
+        )
+
+    @staticmethod
+    def diff(existing: list["ProtocolStep"], contents: list[str]) -> dict:
+        """
+        Plan the writes that turn the existing steps into steps with the given contents.
+        Steps with unchanged content keep their GUIDs, changed steps are updated in place where possible, and each written step names its predecessor.
+        Returns the steps to post, the GUIDs to delete and the number of inserted, updated and unchanged steps.
+        """
+        existing_keys = [step.content_key() for step in existing]
+        desired_keys = [ProtocolStep(id="", **ProtocolStep.parse(content)).content_key() for content in contents]
+        guids = [None] * len(contents)
+        changed = set()
+        deleted = []
+        matcher = difflib.SequenceMatcher(a=existing_keys, b=desired_keys, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                for offset in range(i2 - i1):
+                    guids[j1 + offset] = existing[i1 + offset].id
+                continue
+            # reuse the GUIDs of replaced steps for updates, delete the surplus and insert the rest
+            reused = min(i2 - i1, j2 - j1)
+            for offset in range(reused):
+                guids[j1 + offset] = existing[i1 + offset].id
+                changed.add(j1 + offset)
+            deleted.extend(step.id for step in existing[i1 + reused:i2])
+        existing_previous = {step.id: existing[index - 1].id if index > 0 else None for index, step in enumerate(existing)}
+        steps = []
+        inserted = updated = 0
+        previous_guid = None
+        for index, content in enumerate(contents):
+            guid = guids[index]
+            if guid is None:
+                guid = uuid.uuid4().hex
+                inserted += 1
+            elif index in changed or existing_previous[guid] != previous_guid:
+                updated += 1
+            else:
+                previous_guid = guid
+                continue
+            steps.append({"guid": guid, "previous_guid": previous_guid, "step": content})
+            previous_guid = guid
+        return {
+            "steps": steps,
+            "deleted": deleted,
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": len(contents) - inserted - updated
+        }
+
+    def project(self, summary: bool = False, max_description_length: int | None = None) -> "ProtocolStep | ProtocolStepSummary":
+        """Reduce the step to its ID and first description line, or truncate its description."""
+        if summary:
+            return ProtocolStepSummary(id=self.id, description=_truncate(self.description.split("\n", 1)[0], max_description_length))
+        if max_description_length is None:
+            return self
+        return self.model_copy(update={"description": _truncate(self.description, max_description_length)})
+
+class ProtocolStepSummary(BaseModel):
+    id: Annotated[str, Field(description="Unique identifier for the step")]
+    description: Annotated[str, Field(description="First line of the step description")]
+
+class ProtocolStepPage(BaseModel):
+    steps: Annotated[list[ProtocolStep | ProtocolStepSummary], Field(description="Steps in this page")]
+    offset: Annotated[int, Field(description="Index of the first step in this page, starting from 0")]
+    total_steps: Annotated[int, Field(description="Total number of steps in the protocol")]
+
+class ProtocolSteps(BaseModel):
+    protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")]
+    steps: Annotated[list[ProtocolStep | ProtocolStepSummary], Field(description="Steps of the protocol")]
+
+class ProtocolStepsUpdate(BaseModel):
+    steps: Annotated[list[ProtocolStep], Field(description="Steps of the protocol after the update")]
+    inserted: Annotated[int, Field(description="Number of steps that were added")]
+    updated: Annotated[int, Field(description="Number of existing steps whose content or position was updated")]
+    deleted: Annotated[int, Field(description="Number of steps that were deleted")]
+    unchanged: Annotated[int, Field(description="Number of steps that were left untouched")]
+
 class Protocol(BaseModel):
     id: Annotated[int, Field(description="Unique identifier for the protocol")]
     title: Annotated[str, Field(description="Title of the protocol")]
@@ -120,100 +240,233 @@ class Protocol(BaseModel):
     @classmethod
     async def from_protocol_id(cls, protocol_id: int) -> "Protocol":
         response = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}?content_format=markdown")
-        protocol = response["payload"]
-        return cls(
-            id=protocol_id,
-            title=protocol["title"],
-            description=protocol.get("description") or "",
-            doi=protocol.get("doi") or None,
-            url=protocol.get("url"),
-            created_on=datetime.fromtimestamp(protocol.get("created_on"), tz=timezone.utc),
-            published_on=datetime.fromtimestamp(protocol.get("published_on"), tz=timezone.utc) if protocol.get("published_on") else None
+        if response["status_code"] != 0:
+            raise ValueError(response["status_text"])
+        return cls.from_api_response({**response["payload"], "id": protocol_id})
+
+    @classmethod
+    def from_api_response(cls, data: dict) -> "Protocol":
+        protocol = cls(
+            id=data["id"],
+            title=data["title"],
+            description=data.get("description") or "",
+            doi=data.get("doi") or None,
+            url=data.get("url"),
+            created_on=datetime.fromtimestamp(data.get("created_on"), tz=timezone.utc),
+            published_on=datetime.fromtimestamp(data.get("published_on"), tz=timezone.utc) if data.get("published_on") else None
         )
+        # keep every retrieved protocol searchable with search_local_protocols
+        helpers.current_search_index().add_protocol(protocol.id, protocol.title, protocol.description)
+        return protocol
+
+    @staticmethod
+    def is_complete(data: dict) -> bool:
+        """Check whether a protocol payload, e.g. an item of a protocol listing, has every field needed to build a Protocol."""
+        return all(data.get(field) is not None for field in ("id", "title", "url", "created_on")) and all(field in data for field in ("description", "doi", "published_on"))
+
+    @classmethod
+    async def from_listing(cls, items: list[dict]) -> list["Protocol | ErrorMessage"]:
+        """Build protocols from listing items, fetching only the items that lack a needed field."""
+        protocols = [cls.from_api_response(item) if cls.is_complete(item) else None for item in items]
+        fetched = iter(await cls.from_protocol_ids([item["id"] for item, protocol in zip(items, protocols) if protocol is None]))
+        return [protocol if protocol is not None else next(fetched) for protocol in protocols]
+
+    def project(self, summary: bool = False, max_description_length: int | None = None) -> "Protocol | ProtocolSummary":
+        """Reduce the protocol to its ID and title, or truncate its description."""
+        if summary:
+            return ProtocolSummary(id=self.id, title=self.title)
+        if max_description_length is None:
+            return self
+        return self.model_copy(update={"description": _truncate(self.description, max_description_length)})
+
+    @classmethod
+    async def from_protocol_ids(cls, protocol_ids: list[int]) -> list["Protocol | ErrorMessage"]:
+        results = await concurrency.gather_bounded(cls.from_protocol_id, protocol_ids, helpers.PROTOCOLS_IO_MAX_CONCURRENCY)
+        return [
+            ErrorMessage.from_string(f"Failed to retrieve protocol {protocol_id}: {result}") if isinstance(result, Exception) else result
+            for protocol_id, result in zip(protocol_ids, results)
+        ]
+
+class LocalSearchResult(BaseModel):
+    protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")]
+    title: Annotated[str, Field(description="Title of the protocol, empty if only its steps have been retrieved")]
+    score: Annotated[float, Field(description="Relevance score of the protocol, higher is more relevant")]
+    step_ids: Annotated[list[str], Field(description="IDs of the steps of the protocol that match the query, best match first")]
+
+class ProtocolSummary(BaseModel):
+    id: Annotated[int, Field(description="Unique identifier for the protocol")]
+    title: Annotated[str, Field(description="Title of the protocol")]
+
+class ErrorMessage(BaseModel):
+    error_message: Annotated[str, Field(description="Error message describing the issue encountered")]
+
+    @classmethod
+    def from_string(cls, message: str) -> "ErrorMessage":
+        return cls(error_message=message)
 
 class ProtocolSearchResult(BaseModel):
-    protocols: Annotated[list[Protocol], Field(description="List of protocols matching the search criteria")]
+    protocols: Annotated[list[Protocol | ProtocolSummary | ErrorMessage], Field(description="List of protocols matching the search criteria, a protocol that could not be retrieved is replaced by an error message")]
     current_page: Annotated[int, Field(description="Current page number of the search results, starting from 1")]
     total_pages: Annotated[int, Field(description="Total number of pages available for the search results")]
 
+    @staticmethod
+    def api_path(keyword: str, page: int, page_size: int) -> str:
+        # page_id is zero-based: protocols.io returns page 2 if page 1 is requested
+        return "/v3/protocols?" + urlencode({"filter": "public", "key": keyword, "page_size": page_size, "page_id": page - 1, "content_format": "markdown"})
+
     @classmethod
-    async def from_api_response(cls, data: dict) -> "ProtocolSearchResult":
-        protocols = [await Protocol.from_protocol_id(protocol["id"]) for protocol in data["items"]]
+    async def from_api_response(cls, data: dict, summary: bool = False, max_description_length: int | None = None) -> "ProtocolSearchResult":
+        if summary:
+            protocols = [ProtocolSummary(id=item["id"], title=item["title"]) for item in data["items"]]
+        else:
+            protocols = [protocol.project(max_description_length=max_description_length) if isinstance(protocol, Protocol) else protocol for protocol in await Protocol.from_listing(data["items"])]
         return cls(
             protocols=protocols,
             current_page=data["pagination"]["current_page"],
             total_pages = data["pagination"]["total_pages"]
         )
 
-class ErrorMessage(BaseModel):
-    error_message: Annotated[str, Field(description="Error message describing the issue encountered")]
-
-    @classmethod
-    def from_string(cls, message: str) -> "ErrorMessage":
-        return cls(error_message=message)
-
-@mcp.tool()
+@tool
 async def search_public_protocols(
     keyword: Annotated[str, Field(description="Keyword to search for protocols")],
-    page: Annotated[int, Field(description="Page number for pagination, starting from 1")] = 1,
+    page: Annotated[int, Field(description="Page number for pagination, starting from 1", ge=1)] = 1,
+    page_size: Annotated[int, Field(description=f"Number of protocols per page, at most {helpers.PROTOCOLS_IO_SEARCH_MAX_PAGE_SIZE}", ge=1)] = 3,
+    pages: Annotated[int, Field(description=f"Number of consecutive pages to fetch at once, starting from page, at most {helpers.PROTOCOLS_IO_SEARCH_MAX_PAGES}", ge=1)] = 1,
+    summary: Annotated[bool, Field(description="Return only protocol IDs and titles to keep the response small")] = False,
+    max_description_length: Annotated[int | None, Field(description="Truncate protocol descriptions to this many characters, no truncation if null", ge=1)] = None,
 ) -> ProtocolSearchResult | ErrorMessage:
     """
-    Search for public protocols on protocols.io using a keyword. Results are sorted by protocol popularity and paginated with 3 protocols per page (use the page parameter to navigate, default is 1).
+    Search for public protocols on protocols.io using a keyword. Results are sorted by protocol popularity and paginated with 3 protocols per page by default (use the page parameter to navigate, default is 1).
+    To browse many results, raise page_size or fetch several pages at once with pages; current_page is the last page returned, so continue from current_page + 1.
 
     When searching for reference protocols to create a new protocol:
     - Avoid referencing protocols from before 2015 as they may be outdated.
     - If the found protocols have topics that are not closely related to your needs, ask the user for clearer direction before proceeding.
     - If the found protocols are highly relevant, use get_protocol_steps to examine at least 2 protocols' detailed steps and integrate insights from different approaches to ensure more reliable protocol development.
     """
-    page = page - 1 # weird bug in protocols.io API where it returns page 2 if page 1 is requested
-    response = await helpers.access_protocols_io_resource("GET", f"/v3/protocols?filter=public&key={keyword}&page_size=3&page_id={page}")
-    if response["status_code"] != 0:
-        return ErrorMessage.from_string(response["error_message"])
-    search_result = await ProtocolSearchResult.from_api_response(response)
+    page_size = min(page_size, helpers.PROTOCOLS_IO_SEARCH_MAX_PAGE_SIZE)
+    pages = min(pages, helpers.PROTOCOLS_IO_SEARCH_MAX_PAGES)
+    responses = await asyncio.gather(*(
+        helpers.access_protocols_io_resource("GET", ProtocolSearchResult.api_path(keyword, page_number, page_size))
+        for page_number in range(page, page + pages)
+    ))
+    for response in responses:
+        if response["status_code"] != 0:
+            return ErrorMessage.from_string(response["error_message"])
+    data = {
+        "items": [item for response in responses for item in response["items"]],
+        "pagination": {"current_page": responses[-1]["pagination"]["current_page"], "total_pages": responses[0]["pagination"]["total_pages"]}
+    }
+    # prefetch the pages a continued search would ask for next
+    if helpers.PROTOCOLS_IO_SEARCH_PREFETCH:
+        next_page = data["pagination"]["current_page"] + 1
+        for page_number in range(next_page, min(next_page + pages, data["pagination"]["total_pages"] + 1)):
+            helpers.run_in_background(helpers.access_protocols_io_resource("GET", ProtocolSearchResult.api_path(keyword, page_number, page_size)))
+    search_result = await ProtocolSearchResult.from_api_response(data, summary, max_description_length)
     return search_result
 
-@mcp.tool()
-async def get_my_protocols() -> list[Protocol] | ErrorMessage:
+@tool
+async def get_my_protocols(
+    summary: Annotated[bool, Field(description="Return only protocol IDs and titles to keep the response small")] = False,
+    max_description_length: Annotated[int | None, Field(description="Truncate protocol descriptions to this many characters, no truncation if null", ge=1)] = None,
+) -> list[Protocol | ProtocolSummary | ErrorMessage] | ErrorMessage:
     """
     Retrieve basic information for all protocols belonging to the current user. To get detailed protocol steps, use get_protocol_steps.
+    For users with many protocols, use summary to list only IDs and titles, then get_protocol for the protocols of interest.
     """
     response_profile = await helpers.access_protocols_io_resource("GET", f"/v3/session/profile", {})
     if response_profile["status_code"] != 0:
         return ErrorMessage.from_string(response_profile["error_message"])
     user = User.from_api_response(response_profile["user"])
-    response = await helpers.access_protocols_io_resource("GET", f"/v3/researchers/{user.username}/protocols?filter=user_all")
+    response = await helpers.access_protocols_io_resource("GET", f"/v3/researchers/{user.username}/protocols?filter=user_all&content_format=markdown")
     if response["status_code"] != 0:
-        return ErrorMessage.from_api_response(response["error_message"])
-    protocols = [await Protocol.from_protocol_id(protocol["id"]) for protocol in response.get("items")]
-    return protocols
+        return ErrorMessage.from_string(response["error_message"])
+    if summary:
+        return [ProtocolSummary(id=item["id"], title=item["title"]) for item in response.get("items")]
+    protocols = await Protocol.from_listing(response.get("items"))
+    return [protocol.project(max_description_length=max_description_length) if isinstance(protocol, Protocol) else protocol for protocol in protocols]
 
-@mcp.tool()
+@tool
+async def search_local_protocols(
+    query: Annotated[str, Field(description="Words to search for in titles, descriptions, step text and material names")],
+    limit: Annotated[int, Field(description="Maximum number of protocols to return", ge=1)] = 10,
+) -> list[LocalSearchResult]:
+    """
+    Search the protocols and steps already retrieved by this server, without contacting protocols.io. Results are ranked by relevance.
+    Use it to re-find or cross-reference protocols seen earlier; use search_public_protocols to discover new ones.
+    """
+    return [
+        LocalSearchResult(protocol_id=hit.protocol_id, title=hit.title, score=hit.score, step_ids=hit.step_ids)
+        for hit in helpers.current_search_index().search(query, limit)
+    ]
+
+@tool
 async def get_protocol(
     protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")]
 ) -> Protocol | ErrorMessage:
     """
     Retrieve basic information for a specific protocol by its protocol ID. To get detailed protocol steps, use get_protocol_steps.
     """
-    response = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}")
+    response = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}?content_format=markdown")
     if response["status_code"] != 0:
         return ErrorMessage.from_string(response["status_text"])
-    protocol = await Protocol.from_protocol_id(response["payload"]["id"])
+    protocol = Protocol.from_api_response(response["payload"])
     return protocol
 
-@mcp.tool()
+@tool
 async def get_protocol_steps(
-    protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")]
-) -> list[ProtocolStep] | ErrorMessage:
+    protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")],
+    offset: Annotated[int, Field(description="Index of the first step to return, starting from 0", ge=0)] = 0,
+    limit: Annotated[int | None, Field(description="Maximum number of steps to return, all remaining steps if null", ge=1)] = None,
+    summary: Annotated[bool, Field(description="Return only step IDs and the first line of each description to keep the response small")] = False,
+    max_description_length: Annotated[int | None, Field(description="Truncate step descriptions to this many characters, no truncation if null", ge=1)] = None,
+) -> ProtocolStepPage | ErrorMessage:
     """
     Retrieve the steps for a specific protocol by its protocol ID.
+    For long protocols, page through the steps with offset and limit, or use summary to get an overview first.
     """
     response = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}/steps?content_format=markdown")
     if response["status_code"] != 0:
         return ErrorMessage.from_string(response["status_text"])
-    steps = [ProtocolStep.from_api_response(step) for step in response.get("payload", [])]
-    return steps
+    payload = response.get("payload", [])
+    page = payload[offset:offset + limit if limit is not None else None]
+    steps = [ProtocolStep.from_api_response(step) for step in page]
+    ProtocolStep.index(protocol_id, steps, replace=len(steps) == len(payload))
+    steps = [step.project(summary, max_description_length) for step in steps]
+    return ProtocolStepPage(steps=steps, offset=offset, total_steps=len(payload))
 
-@mcp.tool()
+@tool
+async def get_protocols_batch(
+    protocol_ids: Annotated[list[int], Field(description=f"Unique identifiers of the protocols, at most {helpers.PROTOCOLS_IO_MAX_BATCH_SIZE}", min_length=1)]
+) -> list[Protocol | ErrorMessage] | ErrorMessage:
+    """
+    Retrieve basic information for several protocols at once by their protocol IDs. Results are in the same order as the IDs, and a protocol that could not be retrieved is replaced by an error message.
+    Prefer this over calling get_protocol repeatedly.
+    """
+    if len(protocol_ids) > helpers.PROTOCOLS_IO_MAX_BATCH_SIZE:
+        return ErrorMessage.from_string(f"At most {helpers.PROTOCOLS_IO_MAX_BATCH_SIZE} protocols can be retrieved at once.")
+    return await Protocol.from_protocol_ids(protocol_ids)
+
+@tool
+async def get_protocol_steps_batch(
+    protocol_ids: Annotated[list[int], Field(description=f"Unique identifiers of the protocols, at most {helpers.PROTOCOLS_IO_MAX_BATCH_SIZE}", min_length=1)],
+    summary: Annotated[bool, Field(description="Return only step IDs and the first line of each description to keep the response small")] = False,
+    max_description_length: Annotated[int | None, Field(description="Truncate step descriptions to this many characters, no truncation if null", ge=1)] = None,
+) -> list[ProtocolSteps | ErrorMessage] | ErrorMessage:
+    """
+    Retrieve the steps of several protocols at once by their protocol IDs. Results are in the same order as the IDs, and a protocol whose steps could not be retrieved is replaced by an error message.
+    Prefer this over calling get_protocol_steps repeatedly, e.g. to compare the detailed steps of protocols found with search_public_protocols.
+    """
+    if len(protocol_ids) > helpers.PROTOCOLS_IO_MAX_BATCH_SIZE:
+        return ErrorMessage.from_string(f"At most {helpers.PROTOCOLS_IO_MAX_BATCH_SIZE} protocols can be retrieved at once.")
+    results = await concurrency.gather_bounded(ProtocolStep.from_protocol_id, protocol_ids, helpers.PROTOCOLS_IO_MAX_CONCURRENCY)
+    return [
+        ErrorMessage.from_string(f"Failed to retrieve steps of protocol {protocol_id}: {result}") if isinstance(result, Exception)
+        else ProtocolSteps(protocol_id=protocol_id, steps=[step.project(summary, max_description_length) for step in result])
+        for protocol_id, result in zip(protocol_ids, results)
+    ]
+
+@tool
 async def create_protocol(
     title: Annotated[str, Field(description="Title of the new protocol (plain text only)")],
     description: Annotated[str, Field(description="Description of the new protocol (plain text only)")],
@@ -226,18 +479,18 @@ async def create_protocol(
     response_create_blank_protocol = await helpers.access_protocols_io_resource("POST", f"/v3/protocols/{uuid.uuid4().hex}", {"type_id": 1})
     if response_create_blank_protocol["status_code"] != 0:
         return ErrorMessage.from_string(response_create_blank_protocol["error_message"])
-    protocol = await Protocol.from_protocol_id(response_create_blank_protocol["protocol"]["id"])
+    protocol_id = response_create_blank_protocol["protocol"]["id"]
     data = {"title": title, "description": description}
-    response_update_protocol = await helpers.access_protocols_io_resource("PUT", f"/v4/protocols/{protocol.id}", data)
+    response_update_protocol = await helpers.access_protocols_io_resource("PUT", f"/v4/protocols/{protocol_id}", data)
     if response_update_protocol["status_code"] != 0:
         return ErrorMessage.from_string(response_update_protocol["status_text"])
-    response_get_protocol = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol.id}")
+    response_get_protocol = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}?content_format=markdown")
     if response_get_protocol["status_code"] != 0:
         return ErrorMessage.from_string(response_get_protocol["status_text"])
-    protocol = await Protocol.from_protocol_id(response_get_protocol["payload"]["id"])
+    protocol = Protocol.from_api_response(response_get_protocol["payload"])
     return protocol
 
-@mcp.tool()
+@tool
 async def update_protocol_title(
     protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")],
     title: Annotated[str, Field(description="New title for the protocol (plain text only)")]
@@ -249,13 +502,13 @@ async def update_protocol_title(
     response_update_protocol = await helpers.access_protocols_io_resource("PUT", f"/v4/protocols/{protocol_id}", data)
     if response_update_protocol["status_code"] != 0:
         return ErrorMessage.from_string(response_update_protocol["status_text"])
-    response_get_protocol = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}")
+    response_get_protocol = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}?content_format=markdown")
     if response_get_protocol["status_code"] != 0:
         return ErrorMessage.from_string(response_get_protocol["status_text"])
-    protocol = await Protocol.from_protocol_id(response_get_protocol["payload"]["id"])
+    protocol = Protocol.from_api_response(response_get_protocol["payload"])
     return protocol
 
-@mcp.tool()
+@tool
 async def update_protocol_description(
     protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")],
     description: Annotated[str, Field(description="New description for the protocol (plain text only)")]
@@ -267,54 +520,64 @@ async def update_protocol_description(
     response_update_protocol = await helpers.access_protocols_io_resource("PUT", f"/v4/protocols/{protocol_id}", data)
     if response_update_protocol["status_code"] != 0:
         return ErrorMessage.from_string(response_update_protocol["status_text"])
-    response_get_protocol = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}")
+    response_get_protocol = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}?content_format=markdown")
     if response_get_protocol["status_code"] != 0:
         return ErrorMessage.from_string(response_get_protocol["status_text"])
-    protocol = await Protocol.from_protocol_id(response_get_protocol["payload"]["id"])
+    protocol = Protocol.from_api_response(response_get_protocol["payload"])
     return protocol
 
-@mcp.tool()
+@tool
 async def set_protocol_steps(
     protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")],
     steps: Annotated[list[ProtocolStepInput], Field(description="List of steps to set for the protocol")]
-) -> list[ProtocolStep] | ErrorMessage:
+) -> ProtocolStepsUpdate | ErrorMessage:
     """
-    Replace the entire steps list of a specific protocol by its protocol ID with a new steps list. The existing steps will be completely overwritten.
+    Replace the entire steps list of a specific protocol by its protocol ID with a new steps list.
+    Only the differences are written: unchanged steps keep their step IDs, and the result reports how many steps were inserted, updated, deleted and left unchanged.
     """
     if not steps:
         return ErrorMessage.from_string("At least one step is required to set the protocol steps.")
-    # get all existing steps
-    response_get_steps = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}/steps?content_format=markdown")
+    # get all existing steps while resolving referenced protocols
+    response_get_steps, references = await asyncio.gather(
+        helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}/steps?content_format=markdown"),
+        ProtocolStepInput.resolve_references(steps)
+    )
     if response_get_steps["status_code"] != 0:
         return ErrorMessage.from_string(response_get_steps['status_text'])
+    if isinstance(references, ErrorMessage):
+        return references
     step_existed = [ProtocolStep.from_api_response(step) for step in response_get_steps.get("payload", [])]
-    # delete all existing steps
-    response_delete_protocol_step = await helpers.access_protocols_io_resource("DELETE", f"/v4/protocols/{protocol_id}/steps", {"steps": [step.id for step in step_existed]})
-    if response_delete_protocol_step["status_code"] != 0:
-        return ErrorMessage.from_string(response_delete_protocol_step['status_text'])
-    # set steps
-    data = []
-    previous_step_id = None
-    for step in steps:
-        step_content = await ProtocolStepInput.to_string(step)
-        step_data = {
-            "guid": uuid.uuid4().hex,
-            "previous_guid": previous_step_id,
-            "step": step_content
-        }
-        data.append(step_data)
-        previous_step_id = step_data["guid"]
-    response_set_steps = await helpers.access_protocols_io_resource("POST", f"/v4/protocols/{protocol_id}/steps", {"steps": data})
-    if response_set_steps["status_code"] != 0:
-        return ErrorMessage.from_string(response_set_steps['status_text'])
+    # plan the minimal changes
+    step_contents = [ProtocolStepInput.to_string(step, references) for step in steps]
+    plan = ProtocolStep.diff(step_existed, step_contents)
+    if not plan["steps"] and not plan["deleted"]:
+        ProtocolStep.index(protocol_id, step_existed, replace=True)
+        return ProtocolStepsUpdate(steps=step_existed, inserted=0, updated=0, deleted=0, unchanged=plan["unchanged"])
+    # delete removed steps
+    if plan["deleted"]:
+        response_delete_protocol_step = await helpers.access_protocols_io_resource("DELETE", f"/v4/protocols/{protocol_id}/steps", {"steps": plan["deleted"]})
+        if response_delete_protocol_step["status_code"] != 0:
+            return ErrorMessage.from_string(response_delete_protocol_step['status_text'])
+    # insert new steps and update changed steps
+    if plan["steps"]:
+        response_set_steps = await helpers.access_protocols_io_resource("POST", f"/v4/protocols/{protocol_id}/steps", {"steps": plan["steps"]})
+        if response_set_steps["status_code"] != 0:
+            return ErrorMessage.from_string(response_set_steps['status_text'])
     # get updated steps
     response_get_steps = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}/steps?content_format=markdown")
     if response_get_steps["status_code"] != 0:
         return ErrorMessage.from_string(response_get_steps['status_text'])
     protocol_steps = [ProtocolStep.from_api_response(step) for step in response_get_steps.get("payload", [])]
-    return protocol_steps
+    ProtocolStep.index(protocol_id, protocol_steps, replace=True)
+    return ProtocolStepsUpdate(
+        steps=protocol_steps,
+        inserted=plan["inserted"],
+        updated=plan["updated"],
+        deleted=len(plan["deleted"]),
+        unchanged=plan["unchanged"]
+    )
 
-@mcp.tool()
+@tool
 async def add_protocol_step(
     protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")],
     step: Annotated[ProtocolStepInput, Field(description="Step to be added to the protocol")]
@@ -322,15 +585,20 @@ async def add_protocol_step(
     """
     Add a step to the end of the steps list for a specific protocol by its protocol ID.
     """
-    # get all existing steps
-    response_get_steps = await helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}/steps?content_format=markdown")
+    # get all existing steps while resolving referenced protocols
+    response_get_steps, references = await asyncio.gather(
+        helpers.access_protocols_io_resource("GET", f"/v4/protocols/{protocol_id}/steps?content_format=markdown"),
+        ProtocolStepInput.resolve_references([step])
+    )
     if response_get_steps["status_code"] != 0:
         return ErrorMessage.from_string(response_get_steps["status_text"])
+    if isinstance(references, ErrorMessage):
+        return references
     step_existed = [ProtocolStep.from_api_response(step) for step in response_get_steps.get("payload", [])]
     # get last step ID
     previous_step_id = step_existed[-1].id if step_existed else None
     # add step
-    step_content = await ProtocolStepInput.to_string(step)
+    step_content = ProtocolStepInput.to_string(step, references)
     step_data = {
         "guid": uuid.uuid4().hex,
         "previous_guid": previous_step_id,
@@ -344,9 +612,10 @@ async def add_protocol_step(
     if response_get_steps["status_code"] != 0:
         return ErrorMessage.from_string(response_get_steps["status_text"])
     protocol_steps = [ProtocolStep.from_api_response(step) for step in response_get_steps.get("payload", [])]
+    ProtocolStep.index(protocol_id, protocol_steps, replace=True)
     return protocol_steps
 
-@mcp.tool()
+@tool
 async def delete_protocol_step(
     protocol_id: Annotated[int, Field(description="Unique identifier for the protocol")],
     step_id: Annotated[str, Field(description="Unique identifier for the step to be deleted")]
@@ -361,4 +630,5 @@ async def delete_protocol_step(
     if response_get_protocol_steps["status_code"] != 0:
         return ErrorMessage.from_string(response_get_protocol_steps["status_text"])
     steps = [ProtocolStep.from_api_response(step) for step in response_get_protocol_steps.get("payload", [])]
+    ProtocolStep.index(protocol_id, steps, replace=True)
     return steps
\ No newline at end of file
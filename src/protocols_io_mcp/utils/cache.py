@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    size: int
+    tags: tuple[str, ...]
+
+class TTLCache:
+    """
+    LRU cache whose entries expire after a per-entry TTL, bounded by both entry count and total size in bytes.
+    Entries can be labelled with tags so that every entry related to a resource can be invalidated at once.
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, count_miss: bool = True) -> Any | None:
+        """Return the cached value for key, or None if it is missing or expired. The miss is not counted if count_miss is False."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            if count_miss:
+                self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl: float, size: int, tags: tuple[str, ...] = ()) -> None:
+        """Store value under key for ttl seconds, evicting the least recently used entries to stay within bounds."""
+        if key in self._entries:
+            self._remove(key)
+        if ttl <= 0 or size > self.max_bytes or self.max_entries <= 0:
+            return
+        self._entries[key] = CacheEntry(value, time.monotonic() + ttl, size, tags)
+        self.size += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, tag: str) -> int:
+        """Remove every entry labelled with tag and return how many were removed."""
+        keys = self._tags.pop(tag, set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -0,0 +1,81 @@
+import asyncio
+import httpx
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+from protocols_io_mcp.utils.cache import TTLCache
+from protocols_io_mcp.utils.ratelimit import TokenBucket
+from protocols_io_mcp.utils.search_index import SearchIndex
+
+@dataclass(eq=False)
+class Caller:
+    """
+    State kept for one access token: its connection pool, private responses, rate budget and index of retrieved protocols.
+    active counts the requests and tasks using it, which keep its connections open after it is evicted.
+    """
+    token: str
+    client: httpx.AsyncClient
+    cache: TTLCache
+    rate_limiter: TokenBucket
+    search_index: SearchIndex
+    active: int = 0
+
+class CallerRegistry:
+    """
+    Bounded LRU of callers by access token, creating them on first use with factory.
+    The least recently active caller is dropped once more than max_callers are kept, and its connections are closed
+    as soon as nothing uses it anymore.
+    """
+
+    def __init__(self, factory: Callable[[str], Caller], max_callers: int):
+        self.factory = factory
+        self.max_callers = max(1, max_callers)
+        self._callers: OrderedDict[str, Caller] = OrderedDict()
+        self._closing: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._callers)
+
+    def __iter__(self) -> Iterator[Caller]:
+        return iter(list(self._callers.values()))
+
+    def get(self, token: str) -> Caller:
+        caller = self._callers.get(token)
+        if caller is None or caller.client.is_closed:
+            caller = self._callers[token] = self.factory(token)
+        self._callers.move_to_end(token)
+        while len(self._callers) > self.max_callers:
+            _, evicted = self._callers.popitem(last=False)
+            if evicted.active == 0:
+                self._close(evicted)
+        return caller
+
+    def acquire(self, caller: Caller) -> None:
+        """Keep the connections of caller open until the matching release, even if it is evicted meanwhile."""
+        caller.active += 1
+
+    def release(self, caller: Caller) -> None:
+        caller.active -= 1
+        if caller.active == 0 and self._callers.get(caller.token) is not caller:
+            self._close(caller)
+
+    @contextmanager
+    def use(self, token: str) -> Iterator[Caller]:
+        """Look up the caller for token once, and keep its connections open until the block exits."""
+        caller = self.get(token)
+        self.acquire(caller)
+        try:
+            yield caller
+        finally:
+            self.release(caller)
+
+    def _close(self, caller: Caller) -> None:
+        task = asyncio.ensure_future(caller.client.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close(self) -> None:
+        """Drop every caller and close their connections."""
+        callers, self._callers = list(self._callers.values()), OrderedDict()
+        await asyncio.gather(*(caller.client.aclose() for caller in callers), *self._closing, return_exceptions=True)
@@ -0,0 +1,110 @@
+import math
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Hashable, Iterable, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+async def gather_bounded(func: Callable[[T], Awaitable[R]], items: Iterable[T], limit: int) -> list[R | Exception]:
+    """
+    Run func for every item concurrently with at most limit calls in flight.
+    Results keep the order of items, and an exception raised for one item is returned in its place instead of being raised.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(item: T) -> R | Exception:
+        async with semaphore:
+            try:
+                return await func(item)
+            except Exception as e:
+                return e
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution whose result, or exception, is given to every caller.
+    A caller that is cancelled, or gives up after its own timeout with asyncio.TimeoutError, stops waiting without cancelling
+    the shared execution, unless it was the last caller waiting for it.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[R]], timeout: float | None = None) -> R:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(key, call))
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+                # callers arriving before the task has finished cancelling start a new execution instead of joining it
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # mark the exception as retrieved when every caller stopped waiting before it was raised
+            call.task.exception()
+
+async def hedged(func: Callable[[], Awaitable[R]], delay: float | None, should_hedge: Callable[[], bool] = lambda: True) -> R:
+    """
+    Run func, and run it a second time if it has not finished after delay seconds and should_hedge() agrees.
+    The first call to succeed wins and the other is cancelled; an exception is only raised once both calls failed.
+    Both calls are cancelled when the caller is. A delay of None never hedges.
+    """
+    if delay is None:
+        return await func()
+    tasks = [asyncio.ensure_future(func())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not should_hedge():
+            return await tasks[0]
+        tasks.append(asyncio.ensure_future(func()))
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded or not pending:
+                return (succeeded or list(done))[0].result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+class RecentLatencies:
+    """Sliding window of the latest latencies of an operation, used to pick a hedging delay."""
+
+    def __init__(self, size: int = 100):
+        self._latencies: deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def add(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """Return the q quantile of the window, or None if it is empty."""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
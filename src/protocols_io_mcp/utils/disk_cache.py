@@ -0,0 +1,79 @@
+import os
+import time
+import sqlite3
+from dataclasses import dataclass
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    path TEXT PRIMARY KEY,
+    protocol_id INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_protocol_id ON responses (protocol_id);
+CREATE TABLE IF NOT EXISTS published_protocols (
+    protocol_id INTEGER PRIMARY KEY
+);
+"""
+
+@dataclass
+class StoredResponse:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def validators(self) -> dict[str, str]:
+        """Return the conditional request headers that revalidate this response."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class DiskCache:
+    """
+    SQLite-backed cache of responses about published protocols that persists across server restarts.
+    The database runs in WAL mode with a busy timeout and every write is a single statement, so several server processes can share one file.
+    Its methods block while another process holds the write lock, so async code calls them from a worker thread, one call at a time.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def get(self, path: str) -> StoredResponse | None:
+        row = self._connection.execute("SELECT body, etag, last_modified, stored_at FROM responses WHERE path = ?", (path,)).fetchone()
+        return StoredResponse(*row) if row else None
+
+    def set(self, path: str, protocol_id: int, body: bytes, etag: str | None = None, last_modified: str | None = None) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses (path, protocol_id, body, etag, last_modified, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, protocol_id, body, etag, last_modified, time.time())
+        )
+
+    def touch(self, path: str) -> None:
+        """Mark a stored response as freshly revalidated."""
+        self._connection.execute("UPDATE responses SET stored_at = ? WHERE path = ?", (time.time(), path))
+
+    def mark_published(self, protocol_ids: list[int]) -> None:
+        self._connection.executemany("INSERT OR IGNORE INTO published_protocols (protocol_id) VALUES (?)", [(protocol_id,) for protocol_id in protocol_ids])
+
+    def is_published(self, protocol_id: int) -> bool:
+        return self._connection.execute("SELECT 1 FROM published_protocols WHERE protocol_id = ?", (protocol_id,)).fetchone() is not None
+
+    def invalidate(self, protocol_id: int) -> None:
+        self._connection.execute("DELETE FROM responses WHERE protocol_id = ?", (protocol_id,))
+
+    def close(self) -> None:
+        self._connection.close()
@@ -1,17 +1,539 @@
 import os
+import re
+import json
+import asyncio
+from collections import OrderedDict
+from contextvars import ContextVar
+import importlib.util
+import time
 import httpx
-from typing import Literal, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Literal, Any, AsyncIterator, Awaitable, Iterator
 from dotenv import load_dotenv
+from protocols_io_mcp.utils.cache import TTLCache
+from protocols_io_mcp.utils.callers import Caller, CallerRegistry
+from protocols_io_mcp.utils.concurrency import RecentLatencies, SingleFlight, hedged
+from protocols_io_mcp.utils.disk_cache import DiskCache
+from protocols_io_mcp.utils.metrics import Metrics
+from protocols_io_mcp.utils.ratelimit import TokenBucket, backoff_delay, parse_retry_after
+from protocols_io_mcp.utils.search_index import SearchIndex
 load_dotenv()
 
 PROTOCOLS_IO_CLIENT_ACCESS_TOKEN = os.getenv("PROTOCOLS_IO_CLIENT_ACCESS_TOKEN")
 PROTOCOLS_IO_API_URL = "https://www.protocols.io/api"
 
-async def access_protocols_io_resource(method: Literal["GET", "POST", "PUT", "DELETE"], path: str, data: dict = None) -> dict[str, Any]:
-    """Access protocols.io API with specified method and path."""
+# connection pool settings of the shared HTTP client
+PROTOCOLS_IO_HTTP_TIMEOUT = float(os.getenv("PROTOCOLS_IO_HTTP_TIMEOUT", "30"))
+PROTOCOLS_IO_HTTP_CONNECT_TIMEOUT = float(os.getenv("PROTOCOLS_IO_HTTP_CONNECT_TIMEOUT", "10"))
+PROTOCOLS_IO_HTTP_MAX_CONNECTIONS = int(os.getenv("PROTOCOLS_IO_HTTP_MAX_CONNECTIONS", "20"))
+PROTOCOLS_IO_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PROTOCOLS_IO_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+PROTOCOLS_IO_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("PROTOCOLS_IO_HTTP_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 is only enabled when the optional h2 package is installed (pip install protocols-io-mcp[http2])
+PROTOCOLS_IO_HTTP2 = os.getenv("PROTOCOLS_IO_HTTP2", "true").lower() in ("1", "true", "yes", "on")
+
+# maximum number of upstream requests a single tool call runs concurrently when hydrating lists of IDs
+PROTOCOLS_IO_MAX_CONCURRENCY = int(os.getenv("PROTOCOLS_IO_MAX_CONCURRENCY", "8"))
+# maximum number of protocol IDs accepted by the batch tools
+PROTOCOLS_IO_MAX_BATCH_SIZE = int(os.getenv("PROTOCOLS_IO_MAX_BATCH_SIZE", "20"))
+
+# search results per page and number of pages a single search call may fetch
+PROTOCOLS_IO_SEARCH_MAX_PAGE_SIZE = int(os.getenv("PROTOCOLS_IO_SEARCH_MAX_PAGE_SIZE", "20"))
+PROTOCOLS_IO_SEARCH_MAX_PAGES = int(os.getenv("PROTOCOLS_IO_SEARCH_MAX_PAGES", "5"))
+# fetch the next page of search results in the background while the current one is returned
+PROTOCOLS_IO_SEARCH_PREFETCH = os.getenv("PROTOCOLS_IO_SEARCH_PREFETCH", "true").lower() in ("1", "true", "yes", "on")
+
+# in-memory cache of GET responses, a TTL of 0 disables caching for that kind of resource
+PROTOCOLS_IO_CACHE_MAX_ENTRIES = int(os.getenv("PROTOCOLS_IO_CACHE_MAX_ENTRIES", "1024"))
+PROTOCOLS_IO_CACHE_MAX_BYTES = int(os.getenv("PROTOCOLS_IO_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PROTOCOLS_IO_CACHE_TTLS = {
+    "protocol": float(os.getenv("PROTOCOLS_IO_CACHE_TTL_PROTOCOL", "300")),
+    "steps": float(os.getenv("PROTOCOLS_IO_CACHE_TTL_STEPS", "300")),
+    "search": float(os.getenv("PROTOCOLS_IO_CACHE_TTL_SEARCH", "120")),
+    "listing": float(os.getenv("PROTOCOLS_IO_CACHE_TTL_LISTING", "60")),
+    "profile": float(os.getenv("PROTOCOLS_IO_CACHE_TTL_PROFILE", "600")),
+}
+
+# state kept for each access token taken from incoming requests, enabled with the --caller-tokens option
+PROTOCOLS_IO_MAX_CALLERS = int(os.getenv("PROTOCOLS_IO_MAX_CALLERS", "100"))
+PROTOCOLS_IO_CALLER_CACHE_MAX_ENTRIES = int(os.getenv("PROTOCOLS_IO_CALLER_CACHE_MAX_ENTRIES", "256"))
+PROTOCOLS_IO_CALLER_CACHE_MAX_BYTES = int(os.getenv("PROTOCOLS_IO_CALLER_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+PROTOCOLS_IO_CALLER_INDEX_MAX_PROTOCOLS = int(os.getenv("PROTOCOLS_IO_CALLER_INDEX_MAX_PROTOCOLS", "500"))
+
+# persistent cache of published protocols, enabled with the --cache-dir option
+PROTOCOLS_IO_DISK_CACHE_TTL = float(os.getenv("PROTOCOLS_IO_DISK_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+# maximum number of protocols kept in the local full-text index of retrieved protocols
+PROTOCOLS_IO_INDEX_MAX_PROTOCOLS = int(os.getenv("PROTOCOLS_IO_INDEX_MAX_PROTOCOLS", "5000"))
+
+# client-side rate limit, a rate of 0 disables it
+PROTOCOLS_IO_RATE_LIMIT = float(os.getenv("PROTOCOLS_IO_RATE_LIMIT", "10"))
+PROTOCOLS_IO_RATE_LIMIT_BURST = int(os.getenv("PROTOCOLS_IO_RATE_LIMIT_BURST", "20"))
+# retries of throttled or failed requests, see _is_retryable for which requests are retried
+PROTOCOLS_IO_MAX_RETRIES = int(os.getenv("PROTOCOLS_IO_MAX_RETRIES", "3"))
+PROTOCOLS_IO_RETRY_BACKOFF = float(os.getenv("PROTOCOLS_IO_RETRY_BACKOFF", "0.5"))
+PROTOCOLS_IO_RETRY_BACKOFF_MAX = float(os.getenv("PROTOCOLS_IO_RETRY_BACKOFF_MAX", "30"))
+
+# time a tool call may spend on upstream requests, retries included, 0 disables the deadline
+PROTOCOLS_IO_TOOL_TIMEOUT = float(os.getenv("PROTOCOLS_IO_TOOL_TIMEOUT", "60"))
+# send a duplicate GET when the first one is slower than this quantile of the recent latencies of its endpoint
+PROTOCOLS_IO_HEDGE_GETS = os.getenv("PROTOCOLS_IO_HEDGE_GETS", "false").lower() in ("1", "true", "yes", "on")
+PROTOCOLS_IO_HEDGE_QUANTILE = float(os.getenv("PROTOCOLS_IO_HEDGE_QUANTILE", "0.95"))
+PROTOCOLS_IO_HEDGE_MIN_SAMPLES = int(os.getenv("PROTOCOLS_IO_HEDGE_MIN_SAMPLES", "20"))
+
+_RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# kinds of resources whose responses can be public
+_PUBLIC_KINDS = ("search", "protocol", "steps")
+
+# public responses are shared by every caller, private responses of the server's own access token are kept apart
+response_cache = TTLCache(PROTOCOLS_IO_CACHE_MAX_ENTRIES, PROTOCOLS_IO_CACHE_MAX_BYTES)
+private_cache = TTLCache(PROTOCOLS_IO_CACHE_MAX_ENTRIES, PROTOCOLS_IO_CACHE_MAX_BYTES)
+disk_cache: DiskCache | None = None
+# disk cache calls run in order on one thread, so that a database locked by another process does not block the event loop
+_disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="protocols-io-disk-cache")
+# identical GETs that are in flight at the same time share one upstream request
+inflight_requests = SingleFlight()
+rate_limiter = TokenBucket(PROTOCOLS_IO_RATE_LIMIT, PROTOCOLS_IO_RATE_LIMIT_BURST)
+search_index = SearchIndex(PROTOCOLS_IO_INDEX_MAX_PROTOCOLS)
+# enabled with the --metrics option
+metrics = Metrics()
+# callers authenticating with their own access token, used when caller_tokens is enabled
+caller_tokens = False
+callers = CallerRegistry(lambda token: _new_caller(token), PROTOCOLS_IO_MAX_CALLERS)
+
+_background_tasks: set[asyncio.Task] = set()
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+_client_users = 0
+_client_transport: httpx.AsyncBaseTransport | None = None
+_worker_count = 1
+_caller: ContextVar[Caller | None] = ContextVar("caller", default=None)
+# monotonic time by which the upstream requests of the current tool call must be done
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+# recent latencies of successful GETs by endpoint, from which hedging delays are taken
+_get_latencies: dict[str, RecentLatencies] = {}
+# bumped by every write to a protocol, so that GETs running during a write do not cache what they read before it
+_generations: dict[str, int] = {}
+# IDs of protocols known to be published, whose steps are public
+_published_protocols: OrderedDict[int, None] = OrderedDict()
+_MAX_PUBLISHED_PROTOCOLS = 100_000
+
+def _http2_enabled() -> bool:
+    return PROTOCOLS_IO_HTTP2 and importlib.util.find_spec("h2") is not None
+
+def _new_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=PROTOCOLS_IO_API_URL,
+        timeout=httpx.Timeout(PROTOCOLS_IO_HTTP_TIMEOUT, connect=PROTOCOLS_IO_HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=PROTOCOLS_IO_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=PROTOCOLS_IO_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=PROTOCOLS_IO_HTTP_KEEPALIVE_EXPIRY
+        ),
+        http2=_http2_enabled() if transport is None else False,
+        transport=transport
+    )
+
+def open_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """Create the shared HTTP client, replacing any existing one. A custom transport can be given for testing and is also used by callers."""
+    global _client, _client_loop, _client_transport
+    _client = _new_client(transport)
+    _client_transport = transport
+    _client_loop = asyncio.get_running_loop()
+    return _client
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, opening it if it is missing, closed or bound to another event loop."""
+    if _client is None or _client.is_closed or _client_loop is not asyncio.get_running_loop():
+        return open_client()
+    return _client
+
+async def close_client() -> None:
+    """Close the shared HTTP client and release its pooled connections."""
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+@asynccontextmanager
+async def lifespan(server: Any) -> AsyncIterator[dict]:
+    """Server lifespan that keeps the shared HTTP client open while at least one session is running."""
+    global _client_users
+    get_client()
+    _client_users += 1
+    try:
+        yield {}
+    finally:
+        _client_users -= 1
+        if _client_users == 0:
+            await cancel_background_tasks()
+            await callers.close()
+            await close_client()
+
+async def _detached(coroutine: Awaitable[Any]) -> Any:
+    # the task runs in a copy of the context, so this only lifts the deadline of the tool call that started it for the task
+    _deadline.set(None)
+    return await coroutine
+
+def run_in_background(coroutine: Awaitable[Any]) -> asyncio.Task:
+    """
+    Run a best-effort coroutine, such as a prefetch, without waiting for it. It is cancelled when the last session ends.
+    It is not bound by the deadline of the tool call that started it.
+    """
+    task = asyncio.ensure_future(_detached(coroutine))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    caller = current_caller()
+    if caller is not None:
+        # the task may outlive the request that started it, and must not find the caller's connections closed
+        callers.acquire(caller)
+        task.add_done_callback(lambda _: callers.release(caller))
+    return task
+
+async def cancel_background_tasks() -> None:
+    tasks = [task for task in _background_tasks if not task.done() and task.get_loop() is asyncio.get_running_loop()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+_RESOURCE_KINDS = [
+    ("steps", re.compile(r"/v\d+/protocols/\d+/steps")),
+    ("protocol", re.compile(r"/v\d+/protocols/\d+")),
+    ("search", re.compile(r"/v3/protocols")),
+    ("listing", re.compile(r"/v3/researchers/[^/]+/protocols")),
+    ("profile", re.compile(r"/v3/session/profile")),
+]
+_PROTOCOL_ID_PATTERN = re.compile(r"/v\d+/protocols/(\d+)(?=/|\?|$)")
+_ENDPOINT_ID_PATTERN = re.compile(r"/(?:\d+|[0-9a-f]{32})(?=/|$)")
+_ENDPOINT_USERNAME_PATTERN = re.compile(r"/researchers/[^/]+")
+
+def resource_kind(path: str) -> str | None:
+    """Classify an API path into one of the cached resource kinds, or None if it is not cacheable."""
+    route = path.split("?", 1)[0]
+    return next((kind for kind, pattern in _RESOURCE_KINDS if pattern.fullmatch(route)), None)
+
+def resource_tags(path: str) -> tuple[str, ...]:
+    """Return the cache tags of an API path: the protocol it belongs to, or the listing or search results it is part of."""
+    match = _PROTOCOL_ID_PATTERN.match(path)
+    if match:
+        return (f"protocol:{match.group(1)}",)
+    if resource_kind(path) in ("listing", "search"):
+        return ("listing",)
+    return ()
+
+def endpoint(path: str) -> str:
+    """Return the API path with IDs and usernames replaced by placeholders, to label metrics without unbounded cardinality."""
+    path = _ENDPOINT_ID_PATTERN.sub("/{id}", path.split("?", 1)[0])
+    return _ENDPOINT_USERNAME_PATTERN.sub("/researchers/{username}", path)
+
+def metrics_gauges() -> dict[str, float]:
+    """Return the current state of the response caches, the local index and the callers as gauges."""
+    gauges = {f"protocols_io_cache_{name}": value for name, value in response_cache.stats().items()}
+    gauges.update({f"protocols_io_private_cache_{name}": value for name, value in private_cache.stats().items()})
+    gauges["protocols_io_index_protocols"] = len(search_index)
+    gauges["protocols_io_callers"] = len(callers)
+    return gauges
+
+def _new_caller(token: str) -> Caller:
+    return Caller(
+        token=token,
+        client=_new_client(_client_transport),
+        cache=TTLCache(PROTOCOLS_IO_CALLER_CACHE_MAX_ENTRIES, PROTOCOLS_IO_CALLER_CACHE_MAX_BYTES),
+        rate_limiter=TokenBucket(PROTOCOLS_IO_RATE_LIMIT / _worker_count, max(1, PROTOCOLS_IO_RATE_LIMIT_BURST // _worker_count)),
+        search_index=SearchIndex(PROTOCOLS_IO_CALLER_INDEX_MAX_PROTOCOLS)
+    )
+
+@contextmanager
+def caller_token(token: str | None) -> Iterator[None]:
+    """
+    Send the requests made within the block with the given access token, and keep their private data apart from other callers.
+    The caller is looked up once for the whole block, and its connections stay open until the block exits.
+    """
+    with callers.use(token) if token else nullcontext() as caller:
+        reset = _caller.set(caller)
+        try:
+            yield
+        finally:
+            _caller.reset(reset)
+
+def current_caller() -> Caller | None:
+    """Return the caller whose access token the current request carries, or None when the server's own token is used."""
+    return _caller.get()
+
+def current_search_index() -> SearchIndex:
+    """Return the index of the protocols retrieved by the current caller."""
+    caller = current_caller()
+    return caller.search_index if caller is not None else search_index
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """The tool call an upstream request was made for ran out of time."""
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """
+    Give the upstream requests made within the block, retries included, seconds to complete.
+    A nested deadline can only shorten the current one, and None or 0 leaves it unchanged.
+    """
+    current = _deadline.get()
+    if seconds:
+        at = time.monotonic() + seconds
+        current = at if current is None else min(current, at)
+    reset = _deadline.set(current)
+    try:
+        yield
+    finally:
+        _deadline.reset(reset)
+
+def remaining_time() -> float | None:
+    """Return the seconds left before the deadline of the current tool call, or None if it has none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+def configure_workers(workers: int) -> None:
+    """
+    Give this process its share of the upstream rate limit when the HTTP transport is served by several worker processes,
+    so that adding workers does not multiply the requests sent to protocols.io. Each caller's budget is split the same way.
+    """
+    global rate_limiter, _worker_count
+    _worker_count = workers
+    rate_limiter = TokenBucket(PROTOCOLS_IO_RATE_LIMIT / workers, max(1, PROTOCOLS_IO_RATE_LIMIT_BURST // workers))
+
+def configure_disk_cache(cache_dir: str | None) -> None:
+    """Enable the persistent cache of published protocols in cache_dir, or disable it if cache_dir is None."""
+    global disk_cache
+    if disk_cache is not None:
+        disk_cache.close()
+    disk_cache = DiskCache(os.path.join(cache_dir, "protocols-io-cache.sqlite3")) if cache_dir else None
+
+async def _on_disk(func: Any, *args: Any) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(_disk_executor, func, *args)
+
+async def invalidate_protocol(protocol_id: int | str | None = None) -> None:
+    """Drop cached responses of a protocol and every cached protocol listing or search page, which may include it, for every caller."""
+    tags = ([f"protocol:{protocol_id}"] if protocol_id is not None else []) + ["listing"]
+    for tag in tags:
+        _generations[tag] = _generations.get(tag, 0) + 1
+    caches = [response_cache, private_cache, *(caller.cache for caller in callers)]
+    for cache in caches:
+        for tag in tags:
+            cache.invalidate(tag)
+    if protocol_id is not None and disk_cache is not None:
+        # not abandoned if the write that triggered it is cancelled meanwhile
+        await asyncio.shield(_on_disk(disk_cache.invalidate, int(protocol_id)))
+
+def _generation(path: str) -> tuple[int, ...]:
+    """Return the write generations of the cache tags of path, which change whenever its cached responses are invalidated."""
+    return tuple(_generations.get(tag, 0) for tag in resource_tags(path))
+
+def _mark_published(protocol_ids: list[int]) -> None:
+    for protocol_id in protocol_ids:
+        _published_protocols[protocol_id] = None
+        _published_protocols.move_to_end(protocol_id)
+    while len(_published_protocols) > _MAX_PUBLISHED_PROTOCOLS:
+        _published_protocols.popitem(last=False)
+
+async def _is_public(path: str, kind: str, result: dict) -> bool:
+    """
+    Tell whether a successful GET response only holds public data, which can be cached for every caller:
+    public search results, published protocols and the steps of protocols known to be published.
+    """
+    if kind == "search":
+        _mark_published([item["id"] for item in result.get("items") or [] if _is_published(item)])
+        return True
+    if kind not in ("protocol", "steps"):
+        return False
+    protocol_id = int(_PROTOCOL_ID_PATTERN.match(path).group(1))
+    if kind == "protocol":
+        if not _is_published(result.get("payload") or {}):
+            return False
+        _mark_published([protocol_id])
+        return True
+    return protocol_id in _published_protocols or (disk_cache is not None and await _on_disk(disk_cache.is_published, protocol_id))
+
+def _is_published(protocol: dict) -> bool:
+    return bool(protocol.get("doi")) and bool(protocol.get("published_on"))
+
+async def _store_on_disk(path: str, kind: str, result: dict, response: httpx.Response, generation: tuple[int, ...]) -> None:
+    """Persist a successful response if it belongs to a published protocol and no write invalidated it since generation was taken."""
+    if kind == "search":
+        await _on_disk(disk_cache.mark_published, [item["id"] for item in result.get("items") or [] if _is_published(item)])
+        return
+    if kind not in ("protocol", "steps"):
+        return
+    protocol_id = int(_PROTOCOL_ID_PATTERN.match(path).group(1))
+    if kind == "protocol" and _is_published(result.get("payload") or {}):
+        await _on_disk(disk_cache.mark_published, [protocol_id])
+    elif not await _on_disk(disk_cache.is_published, protocol_id):
+        return
+    # disk calls run in order, so an invalidation queued after this check also runs after the store
+    if _generation(path) == generation:
+        await _on_disk(disk_cache.set, path, protocol_id, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+def _is_retryable(method: str, response: httpx.Response | None = None, error: httpx.TransportError | None = None) -> bool:
+    """
+    GETs are retried on throttling, server errors and transport errors.
+    POST, PUT and DELETE are not idempotent here, so they are only retried when the request cannot have been processed:
+    when it was throttled with a 429 or the connection could not be established.
+    """
+    if error is not None:
+        return method == "GET" or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+    if method == "GET":
+        return response.status_code in _RETRYABLE_STATUS_CODES
+    return response.status_code == 429
+
+async def _send(client: httpx.AsyncClient, method: str, path: str, data: dict | None, headers: dict[str, str]) -> httpx.Response:
+    """Send one request, giving up when the deadline of the current tool call passes."""
+    remaining = remaining_time()
+    if remaining is None:
+        return await client.request(method, path, json=data, headers=headers)
+    if remaining <= 0:
+        raise DeadlineExceeded("The tool call ran out of time before the request was sent")
+    try:
+        return await asyncio.wait_for(client.request(method, path, json=data, headers=headers), remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("protocols.io did not answer before the deadline of the tool call") from None
+
+def _hedge_delay(method: str, path: str) -> float | None:
+    """Return how long to wait for a GET before sending a duplicate, or None if it should not be hedged."""
+    if method != "GET" or not PROTOCOLS_IO_HEDGE_GETS:
+        return None
+    latencies = _get_latencies.get(endpoint(path))
+    if latencies is None or len(latencies) < PROTOCOLS_IO_HEDGE_MIN_SAMPLES:
+        return None
+    return latencies.quantile(PROTOCOLS_IO_HEDGE_QUANTILE)
+
+def _past_deadline(delay: float) -> bool:
+    remaining = remaining_time()
+    return remaining is not None and delay >= remaining
+
+async def _request(method: str, path: str, data: dict | None = None, headers: dict[str, str] | None = None) -> httpx.Response:
+    """
+    Send a rate-limited request, retrying with jittered exponential backoff or the delay given by Retry-After.
+    Retries stop at the deadline of the current tool call, and a slow GET may be hedged with a duplicate request.
+    """
+    caller = current_caller()
+    limiter = caller.rate_limiter if caller is not None else rate_limiter
+    client = caller.client if caller is not None else get_client()
+    # with caller tokens, the server's own token is never used on behalf of a request
+    token = caller.token if caller is not None else None if caller_tokens else PROTOCOLS_IO_CLIENT_ACCESS_TOKEN
     headers = {
-        "Authorization": f"Bearer {PROTOCOLS_IO_CLIENT_ACCESS_TOKEN}"
+        **({"Authorization": f"Bearer {token}"} if token else {}),
+        **(headers or {})
     }
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.request(method, f"{PROTOCOLS_IO_API_URL}{path}", json=data, headers=headers)
-        return response.json()
\ No newline at end of file
+    metrics_endpoint = endpoint(path)
+
+    def should_hedge() -> bool:
+        # a duplicate request must not wait for, or exceed, the rate limit
+        if not limiter.try_acquire():
+            return False
+        metrics.increment("protocols_io_upstream_hedged_requests_total", method=method, endpoint=metrics_endpoint)
+        return True
+
+    attempt = 0
+    while True:
+        if not await limiter.acquire(timeout=remaining_time()):
+            raise DeadlineExceeded("The tool call would run out of time waiting for the rate limit")
+        started = time.perf_counter()
+        try:
+            response = await hedged(lambda: _send(client, method, path, data, headers), _hedge_delay(method, path), should_hedge)
+        except httpx.TransportError as e:
+            metrics.record_upstream(method, metrics_endpoint, type(e).__name__, time.perf_counter() - started, 0, 0)
+            if attempt >= PROTOCOLS_IO_MAX_RETRIES or isinstance(e, DeadlineExceeded) or not _is_retryable(method, error=e):
+                raise
+            delay = backoff_delay(attempt, PROTOCOLS_IO_RETRY_BACKOFF, PROTOCOLS_IO_RETRY_BACKOFF_MAX)
+            if _past_deadline(delay):
+                raise
+        else:
+            elapsed = time.perf_counter() - started
+            metrics.record_upstream(method, metrics_endpoint, str(response.status_code), elapsed, len(response.request.content), len(response.content))
+            if method == "GET" and response.status_code not in _RETRYABLE_STATUS_CODES:
+                _get_latencies.setdefault(metrics_endpoint, RecentLatencies()).add(elapsed)
+            if attempt >= PROTOCOLS_IO_MAX_RETRIES or not _is_retryable(method, response=response):
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            delay = min(retry_after, PROTOCOLS_IO_RETRY_BACKOFF_MAX) if retry_after is not None else backoff_delay(attempt, PROTOCOLS_IO_RETRY_BACKOFF, PROTOCOLS_IO_RETRY_BACKOFF_MAX)
+            if response.status_code == 429:
+                # slow down every request, not just this one
+                limiter.pause(delay)
+            if _past_deadline(delay):
+                # a retry could not complete in time, so report this response
+                return response
+            await response.aclose()
+        attempt += 1
+        await asyncio.sleep(delay)
+
+def _error_result(status_code: int, message: str) -> dict[str, Any]:
+    """Build an error in the shape of a protocols.io response, so callers can handle it like any API error."""
+    return {"status_code": status_code, "status_text": message, "error_message": message}
+
+def _to_result(response: httpx.Response) -> dict[str, Any]:
+    try:
+        return response.json()
+    except ValueError:
+        return _error_result(response.status_code, f"protocols.io returned HTTP {response.status_code} {response.reason_phrase} with a non-JSON body")
+
+def _private_cache() -> TTLCache:
+    caller = current_caller()
+    return caller.cache if caller is not None else private_cache
+
+async def _get(path: str, data: dict | None, generation: tuple[int, ...]) -> dict[str, Any]:
+    """Fetch a GET response and cache it, unless a write invalidated it since generation was taken."""
+    kind = resource_kind(path)
+    stored = await _on_disk(disk_cache.get, path) if disk_cache is not None and kind in ("protocol", "steps") else None
+    # responses may predate a write made while they were awaited, and must then not outlive it in a cache
+    if stored is not None and stored.is_fresh(PROTOCOLS_IO_DISK_CACHE_TTL):
+        result = json.loads(stored.body)
+        if _generation(path) == generation:
+            response_cache.set(path, result, PROTOCOLS_IO_CACHE_TTLS[kind], len(stored.body), resource_tags(path))
+        return result
+    try:
+        response = await _request("GET", path, data, stored.validators() if stored is not None else None)
+    except httpx.TransportError as e:
+        return _error_result(-1, f"Failed to reach protocols.io: {e!r}")
+    if response.status_code == 304 and stored is not None:
+        result = json.loads(stored.body)
+        if _generation(path) == generation:
+            response_cache.set(path, result, PROTOCOLS_IO_CACHE_TTLS[kind], len(stored.body), resource_tags(path))
+            await _on_disk(disk_cache.touch, path)
+        return result
+    result = _to_result(response)
+    if kind is not None and isinstance(result, dict) and result.get("status_code") == 0:
+        cache = response_cache if await _is_public(path, kind, result) else _private_cache()
+        if _generation(path) == generation:
+            cache.set(path, result, PROTOCOLS_IO_CACHE_TTLS[kind], len(response.content), resource_tags(path))
+            if disk_cache is not None:
+                await _store_on_disk(path, kind, result, response, generation)
+    return result
+
+async def access_protocols_io_resource(method: Literal["GET", "POST", "PUT", "DELETE"], path: str, data: dict = None) -> dict[str, Any]:
+    """
+    Access protocols.io API with specified method and path.
+    Successful GET responses are cached, identical GETs in flight share one request, and writes invalidate the protocol they touch.
+    """
+    if method == "GET":
+        # a lookup counts as one hit or one miss, a miss of a public kind going to the shared cache
+        public = resource_kind(path) in _PUBLIC_KINDS
+        cached = response_cache.get(path, count_miss=False) if public else None
+        if cached is None:
+            cached = _private_cache().get(path, count_miss=not public)
+        if cached is None and public:
+            response_cache.misses += 1
+        if cached is not None:
+            return cached
+        # requests of different callers are never shared, since they may see different data,
+        # and a GET made after a write does not join one that was sent before it.
+        # A shared request has no deadline of its own, each tool call waiting for it stops at its own deadline.
+        generation = _generation(path)
+        try:
+            return await inflight_requests.do((current_caller(), path, generation), lambda: _detached(_get(path, data, generation)), remaining_time())
+        except asyncio.TimeoutError:
+            error = DeadlineExceeded("protocols.io did not answer before the deadline of the tool call")
+            return _error_result(-1, f"Failed to reach protocols.io: {error!r}")
+    try:
+        response = await _request(method, path, data)
+    except httpx.TransportError as e:
+        return _error_result(-1, f"Failed to reach protocols.io: {e!r}")
+    finally:
+        match = _PROTOCOL_ID_PATTERN.match(path)
+        await invalidate_protocol(match.group(1) if match else None)
+    return _to_result(response)
@@ -0,0 +1,159 @@
+import time
+import functools
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+_HELP = {
+    "protocols_io_tool_calls_total": ("counter", "Tool calls by tool and outcome"),
+    "protocols_io_tool_duration_seconds": ("histogram", "Duration of tool calls"),
+    "protocols_io_tool_upstream_requests": ("histogram", "Upstream requests sent per tool call, including retries"),
+    "protocols_io_upstream_requests_total": ("counter", "Upstream requests by endpoint and HTTP status or transport error"),
+    "protocols_io_upstream_duration_seconds": ("histogram", "Duration of upstream requests"),
+    "protocols_io_upstream_bytes_total": ("counter", "Bytes sent to and received from protocols.io"),
+    "protocols_io_step_parse_seconds_total": ("counter", "Time spent parsing protocol steps"),
+    "protocols_io_step_parse_calls_total": ("counter", "Number of parsed protocol steps"),
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, as exposed by Prometheus."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # the last count is for values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Return (upper bound, count of values up to it) pairs, ending with +Inf."""
+        result, total = [], 0
+        for bound, count in zip([*map(_format_number, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+class Metrics:
+    """
+    Counters and histograms of tool calls, upstream requests and step parsing, rendered for Prometheus or as a JSON snapshot.
+    Nothing is recorded while disabled, and every recording method returns after a single attribute check.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, Histogram]] = {}
+        # upstream requests sent on behalf of the current tool call
+        self._tool_requests: ContextVar[list[int] | None] = ContextVar("tool_requests", default=None)
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._histograms.clear()
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> None:
+        if not self.enabled:
+            return
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def start_tool_call(self) -> list[int]:
+        """Start counting the upstream requests of the current tool call and return the counter."""
+        counter = [0]
+        self._tool_requests.set(counter)
+        return counter
+
+    def record_upstream(self, method: str, endpoint: str, status: str, seconds: float, sent: int, received: int) -> None:
+        """Record one upstream request attempt and count it for the tool call it was sent for."""
+        if not self.enabled:
+            return
+        counter = self._tool_requests.get()
+        if counter is not None:
+            counter[0] += 1
+        self.increment("protocols_io_upstream_requests_total", method=method, endpoint=endpoint, status=status)
+        self.observe("protocols_io_upstream_duration_seconds", seconds, method=method, endpoint=endpoint)
+        self.increment("protocols_io_upstream_bytes_total", sent, method=method, endpoint=endpoint, direction="sent")
+        self.increment("protocols_io_upstream_bytes_total", received, method=method, endpoint=endpoint, direction="received")
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """Decorate a function to add its run time to {name}_seconds_total and count its calls in {name}_calls_total."""
+        def decorator(func: F) -> F:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.increment(f"{name}_seconds_total", time.perf_counter() - started)
+                    self.increment(f"{name}_calls_total")
+            return wrapper
+        return decorator
+
+    def snapshot(self, gauges: dict[str, float] | None = None) -> dict[str, Any]:
+        """Return every series as plain data, e.g. to serve it as JSON."""
+        return {
+            "enabled": self.enabled,
+            "counters": {name: [{"labels": dict(labels), "value": value} for labels, value in series.items()] for name, series in self._counters.items()},
+            "histograms": {
+                name: [{"labels": dict(labels), "count": histogram.count, "sum": histogram.sum, "buckets": dict(histogram.cumulative())} for labels, histogram in series.items()]
+                for name, series in self._histograms.items()
+            },
+            "gauges": gauges or {}
+        }
+
+    def render(self, gauges: dict[str, float] | None = None) -> str:
+        """Render every series in the Prometheus text exposition format."""
+        lines = []
+        for name, series in self._counters.items():
+            lines.extend(_header(name, "counter"))
+            lines.extend(f"{name}{_format_labels(labels)} {_format_number(value)}" for labels, value in series.items())
+        for name, series in self._histograms.items():
+            lines.extend(_header(name, "histogram"))
+            for labels, histogram in series.items():
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+def _header(name: str, kind: str) -> list[str]:
+    kind, description = _HELP.get(name, (kind, None))
+    return ([f"# HELP {name} {description}"] if description else []) + [f"# TYPE {name} {kind}"]
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
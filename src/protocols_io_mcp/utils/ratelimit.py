@@ -0,0 +1,84 @@
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+class TokenBucket:
+    """
+    Token bucket limiting requests to rate per second with bursts of up to burst requests.
+    Callers reserve a token in arrival order and sleep until it becomes available, so no lock is needed.
+    A rate of 0 or less disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds the caller has to wait before using it."""
+        now = time.monotonic()
+        pause = max(0.0, self.paused_until - now)
+        if self.rate <= 0:
+            return pause
+        self._refill(now)
+        self.tokens -= 1
+        return max(pause, -self.tokens / self.rate if self.tokens < 0 else 0.0)
+
+    def _release(self) -> None:
+        # give an unused reservation back
+        if self.rate > 0:
+            self.tokens += 1
+
+    async def acquire(self, timeout: float | None = None) -> bool:
+        """Wait for a token. Without waiting, return False and take no token if it would not be available within timeout seconds."""
+        delay = self.reserve()
+        if delay <= 0:
+            return True
+        if timeout is not None and delay > timeout:
+            self._release()
+            return False
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        return True
+
+    def try_acquire(self) -> bool:
+        """Take a token only if it can be used right away."""
+        if self.reserve() <= 0:
+            return True
+        self._release()
+        return False
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for the given number of seconds, e.g. after the server asked to slow down."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given zero-based retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,129 @@
+import re
+import math
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+# title terms count more than description and step terms
+_TITLE_WEIGHT = 3
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+@dataclass
+class IndexedProtocol:
+    title: str
+    documents: set[tuple[int, str | None]] = field(default_factory=set)
+
+@dataclass
+class SearchHit:
+    protocol_id: int
+    title: str
+    score: float
+    step_ids: list[str]
+
+class SearchIndex:
+    """
+    In-memory inverted index with BM25 ranking over protocols and their steps.
+    Each protocol is one document for its title and description and each step is one document for its description and material names.
+    The least recently indexed protocols are dropped once more than max_protocols are indexed.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, max_protocols: int):
+        self.max_protocols = max_protocols
+        self._protocols: OrderedDict[int, IndexedProtocol] = OrderedDict()
+        # length and distinct terms of every document, keyed by (protocol ID, step ID or None)
+        self._documents: dict[tuple[int, str | None], tuple[int, tuple[str, ...]]] = {}
+        self._postings: dict[str, dict[tuple[int, str | None], int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._protocols)
+
+    def add_protocol(self, protocol_id: int, title: str, description: str) -> None:
+        """Index or re-index the title and description of a protocol."""
+        protocol = self._touch(protocol_id, title)
+        self._add_document(protocol, (protocol_id, None), Counter(tokenize(title) * _TITLE_WEIGHT + tokenize(description)))
+        self._evict()
+
+    def add_steps(self, protocol_id: int, steps: list[tuple[str, str]], replace: bool = False) -> None:
+        """
+        Index (step ID, text) pairs of a protocol.
+        With replace, the given steps are the complete list and previously indexed steps missing from it are removed.
+        """
+        protocol = self._touch(protocol_id, None)
+        if replace:
+            for document in [document for document in protocol.documents if document[1] is not None]:
+                self._remove_document(protocol, document)
+        for step_id, text in steps:
+            self._add_document(protocol, (protocol_id, step_id), Counter(tokenize(text)))
+        self._evict()
+
+    def remove_protocol(self, protocol_id: int) -> None:
+        protocol = self._protocols.pop(protocol_id, None)
+        if protocol is not None:
+            for document in list(protocol.documents):
+                self._remove_document(protocol, document)
+
+    def search(self, query: str, limit: int = 10) -> list[SearchHit]:
+        """Rank indexed protocols by the best BM25 score of their documents, listing the steps that matched."""
+        terms = set(tokenize(query))
+        if not terms or not self._documents:
+            return []
+        document_count = len(self._documents)
+        average_length = self._total_length / document_count or 1.0
+        scores: dict[tuple[int, str | None], float] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for document, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._documents[document][0] / average_length)
+                scores[document] = scores.get(document, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        hits: dict[int, SearchHit] = {}
+        for (protocol_id, step_id), score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            hit = hits.get(protocol_id)
+            if hit is None:
+                hit = hits[protocol_id] = SearchHit(protocol_id, self._protocols[protocol_id].title, score, [])
+            if step_id is not None:
+                hit.step_ids.append(step_id)
+        return sorted(hits.values(), key=lambda hit: hit.score, reverse=True)[:limit]
+
+    def _touch(self, protocol_id: int, title: str | None) -> IndexedProtocol:
+        protocol = self._protocols.get(protocol_id)
+        if protocol is None:
+            protocol = self._protocols[protocol_id] = IndexedProtocol(title or "")
+        elif title is not None:
+            protocol.title = title
+        self._protocols.move_to_end(protocol_id)
+        return protocol
+
+    def _add_document(self, protocol: IndexedProtocol, document: tuple[int, str | None], frequencies: Counter) -> None:
+        self._remove_document(protocol, document)
+        protocol.documents.add(document)
+        length = sum(frequencies.values())
+        self._documents[document] = (length, tuple(frequencies))
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[document] = frequency
+
+    def _remove_document(self, protocol: IndexedProtocol, document: tuple[int, str | None]) -> None:
+        indexed = self._documents.pop(document, None)
+        if indexed is None:
+            return
+        length, terms = indexed
+        protocol.documents.discard(document)
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            del postings[document]
+            if not postings:
+                del self._postings[term]
+
+    def _evict(self) -> None:
+        while len(self._protocols) > self.max_protocols:
+            self.remove_protocol(next(iter(self._protocols)))
@@ -0,0 +1,55 @@
+import re
+import inspect
+import httpx
+import pytest
+import pytest_asyncio
+from typing import Any, Callable
+from protocols_io_mcp.utils import helpers
+from protocols_io_mcp.utils.cache import TTLCache
+from protocols_io_mcp.utils.callers import CallerRegistry
+from protocols_io_mcp.utils.ratelimit import TokenBucket
+from protocols_io_mcp.utils.search_index import SearchIndex
+
+class FakeProtocolsIO:
+    """In-memory stand-in for the protocols.io API that records every request it receives."""
+
+    def __init__(self):
+        self.routes: dict[tuple[str, str], Callable[[httpx.Request], Any]] = {}
+        self.requests: list[httpx.Request] = []
+
+    def route(self, method: str, path: str, response: Any) -> None:
+        """Register a JSON response, or a (possibly async) callable taking the request and returning one, for a method and API path regex."""
+        self.routes[(method, path)] = response if callable(response) else lambda request: response
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path.removeprefix(httpx.URL(helpers.PROTOCOLS_IO_API_URL).path)
+        handler = next((handler for (method, pattern), handler in self.routes.items() if method == request.method and re.fullmatch(pattern, path)), None)
+        if handler is None:
+            return httpx.Response(404, json={"status_code": 1, "status_text": "Not found", "error_message": "Not found"})
+        response = handler(request)
+        if inspect.isawaitable(response):
+            response = await response
+        return response if isinstance(response, httpx.Response) else httpx.Response(200, json=response)
+
+@pytest_asyncio.fixture
+async def fake_api():
+    api = FakeProtocolsIO()
+    helpers.open_client(httpx.MockTransport(api.handle))
+    yield api
+    await helpers.close_client()
+
+@pytest.fixture(autouse=True)
+def reset_request_state(monkeypatch):
+    monkeypatch.setattr(helpers, "response_cache", TTLCache(helpers.PROTOCOLS_IO_CACHE_MAX_ENTRIES, helpers.PROTOCOLS_IO_CACHE_MAX_BYTES))
+    monkeypatch.setattr(helpers, "private_cache", TTLCache(helpers.PROTOCOLS_IO_CACHE_MAX_ENTRIES, helpers.PROTOCOLS_IO_CACHE_MAX_BYTES))
+    monkeypatch.setattr(helpers, "rate_limiter", TokenBucket(rate=0, burst=1))
+    monkeypatch.setattr(helpers, "search_index", SearchIndex(max_protocols=100))
+    monkeypatch.setattr(helpers, "callers", CallerRegistry(helpers._new_caller, max_callers=2))
+    monkeypatch.setattr(helpers, "_get_latencies", {})
+    # process settings that create_app and configure_workers change
+    monkeypatch.setattr(helpers, "_worker_count", 1)
+    monkeypatch.setattr(helpers, "caller_tokens", False)
+    monkeypatch.setattr(helpers, "disk_cache", None)
+    monkeypatch.setattr(helpers.metrics, "enabled", helpers.metrics.enabled)
+    monkeypatch.setattr(helpers, "PROTOCOLS_IO_RETRY_BACKOFF", 0.0)
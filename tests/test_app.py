@@ -0,0 +1,29 @@
+import pytest
+from protocols_io_mcp.app import create_app
+from protocols_io_mcp.server import mcp
+from protocols_io_mcp.utils import helpers
+
+def test_configure_workers_splits_rate_limit():
+    """
+    Test that each worker gets its share of the upstream rate limit.
+    """
+    helpers.configure_workers(4)
+    assert helpers.rate_limiter.rate == helpers.PROTOCOLS_IO_RATE_LIMIT / 4
+    assert helpers.rate_limiter.burst == helpers.PROTOCOLS_IO_RATE_LIMIT_BURST // 4
+    assert helpers.callers.get("alice").rate_limiter.rate == helpers.PROTOCOLS_IO_RATE_LIMIT / 4
+
+@pytest.mark.asyncio
+async def test_worker_keeps_client_open_across_stateless_sessions(monkeypatch):
+    """
+    Test that the HTTP client of a worker outlives the per-request sessions of the stateless transport.
+    """
+    monkeypatch.setenv("PROTOCOLS_IO_WORKERS", "2")
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        client = helpers.get_client()
+        # a stateless request runs the server lifespan for its own session
+        async with helpers.lifespan(mcp):
+            pass
+        assert helpers.get_client() is client and not client.is_closed
+        assert helpers.rate_limiter.rate == helpers.PROTOCOLS_IO_RATE_LIMIT / 2
+    assert client.is_closed
@@ -0,0 +1,45 @@
+import time
+from protocols_io_mcp.utils.cache import TTLCache
+
+def test_lru_eviction_by_entries_and_bytes():
+    """
+    Test that the least recently used entries are evicted when either bound is exceeded.
+    """
+    cache = TTLCache(max_entries=2, max_bytes=100)
+    cache.set("a", 1, ttl=60, size=10)
+    cache.set("b", 2, ttl=60, size=10)
+    assert cache.get("a") == 1
+    cache.set("c", 3, ttl=60, size=10)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    cache.set("d", 4, ttl=60, size=95)
+    assert len(cache) == 1
+    assert cache.size == 95
+    assert cache.stats()["evictions"] == 3
+
+def test_entries_expire_after_ttl(monkeypatch):
+    """
+    Test that an entry is no longer returned once its TTL has passed.
+    """
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache = TTLCache(max_entries=10, max_bytes=100)
+    cache.set("a", 1, ttl=5, size=1)
+    assert cache.get("a") == 1
+    monkeypatch.setattr(time, "monotonic", lambda: now + 5)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_invalidate_by_tag():
+    """
+    Test that invalidating a tag removes only the entries labelled with it.
+    """
+    cache = TTLCache(max_entries=10, max_bytes=100)
+    cache.set("/v4/protocols/1", 1, ttl=60, size=1, tags=("protocol:1",))
+    cache.set("/v4/protocols/1/steps", 2, ttl=60, size=1, tags=("protocol:1",))
+    cache.set("/v4/protocols/2", 3, ttl=60, size=1, tags=("protocol:2",))
+    assert cache.invalidate("protocol:1") == 2
+    assert cache.get("/v4/protocols/1") is None
+    assert cache.get("/v4/protocols/2") == 3
+    assert cache.size == 1
@@ -0,0 +1,124 @@
+import asyncio
+import httpx
+import pytest
+from fastmcp import Client
+from fastmcp.client.transports import StreamableHttpTransport
+from protocols_io_mcp.app import create_app
+from protocols_io_mcp.utils import helpers
+
+def caller_of(request: httpx.Request) -> str:
+    return request.headers["Authorization"].removeprefix("Bearer ")
+
+def protocol_payload(protocol_id: int, published: bool) -> dict:
+    return {
+        "id": protocol_id,
+        "title": f"Protocol {protocol_id}",
+        "description": "",
+        "doi": f"dx.doi.org/10.17504/protocols.io.{protocol_id}" if published else None,
+        "url": f"https://www.protocols.io/view/{protocol_id}",
+        "created_on": 1700000000,
+        "published_on": 1700000000 if published else None
+    }
+
+def http_transport(app, headers: dict[str, str]) -> StreamableHttpTransport:
+    def client_factory(headers=None, timeout=None, auth=None):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://testserver", headers=headers, timeout=timeout, auth=auth)
+    return StreamableHttpTransport("http://testserver/mcp", headers=headers, httpx_client_factory=client_factory)
+
+@pytest.mark.asyncio
+async def test_private_data_is_kept_per_caller_and_public_data_is_shared(fake_api):
+    """
+    Test that each caller sends its own token and gets its own private responses, while public responses are fetched once for every caller.
+    """
+    fake_api.route("GET", "/v3/session/profile", lambda request: {"status_code": 0, "user": {"username": caller_of(request)}})
+    fake_api.route("GET", "/v4/protocols/1", {"status_code": 0, "payload": protocol_payload(1, published=True)})
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": []})
+    fake_api.route("GET", "/v4/protocols/2", {"status_code": 0, "payload": protocol_payload(2, published=False)})
+    for token in ("alice", "bob"):
+        with helpers.caller_token(token):
+            profile = await helpers.access_protocols_io_resource("GET", "/v3/session/profile")
+            assert profile["user"]["username"] == token
+            for path in ("/v4/protocols/1", "/v4/protocols/1/steps", "/v4/protocols/2"):
+                await helpers.access_protocols_io_resource("GET", path)
+    requests = [(request.url.path.removeprefix("/api"), caller_of(request)) for request in fake_api.requests]
+    assert requests.count(("/v4/protocols/1", "alice")) == 1 and ("/v4/protocols/1", "bob") not in requests
+    assert requests.count(("/v4/protocols/1/steps", "alice")) == 1 and ("/v4/protocols/1/steps", "bob") not in requests
+    assert ("/v4/protocols/2", "alice") in requests and ("/v4/protocols/2", "bob") in requests
+
+@pytest.mark.asyncio
+async def test_callers_are_evicted_least_recently_used_first(fake_api):
+    """
+    Test that the registry keeps at most max_callers callers and closes the connections of the evicted ones.
+    """
+    alice = helpers.callers.get("alice")
+    helpers.callers.get("bob")
+    helpers.callers.get("alice")
+    helpers.callers.get("carol")
+    assert [caller.token for caller in helpers.callers] == ["alice", "carol"]
+    await helpers.callers.close()
+    assert alice.client.is_closed and len(helpers.callers) == 0
+
+@pytest.mark.asyncio
+async def test_an_evicted_caller_keeps_its_connections_until_its_requests_finish(fake_api):
+    """
+    Test that a caller evicted while it has a request in flight can finish it, and its connections are closed afterwards.
+    """
+    started, release = asyncio.Event(), asyncio.Event()
+    async def slow(request: httpx.Request) -> dict:
+        started.set()
+        await release.wait()
+        return {"status_code": 0, "user": {"username": caller_of(request)}}
+    fake_api.route("GET", "/v3/session/profile", slow)
+    fake_api.route("GET", "/v4/protocols/2", {"status_code": 0, "payload": protocol_payload(2, published=False)})
+    async def requests_of(token: str) -> list[dict]:
+        with helpers.caller_token(token):
+            return [await helpers.access_protocols_io_resource("GET", path) for path in ("/v3/session/profile", "/v4/protocols/2")]
+    task = asyncio.create_task(requests_of("alice"))
+    await started.wait()
+    alice = next(caller for caller in helpers.callers if caller.token == "alice")
+    for token in ("bob", "carol"):
+        with helpers.caller_token(token):
+            pass
+    assert [caller.token for caller in helpers.callers] == ["bob", "carol"]
+    assert not alice.client.is_closed
+    release.set()
+    profile, protocol = await task
+    assert profile["user"]["username"] == "alice" and protocol["payload"]["id"] == 2
+    await helpers.callers.close()
+    assert alice.client.is_closed
+
+@pytest.mark.asyncio
+async def test_tools_use_the_bearer_token_of_each_http_request(fake_api, monkeypatch):
+    """
+    Test that, with caller tokens enabled, tool calls over HTTP are sent upstream with the caller's token and only search that caller's protocols.
+    """
+    monkeypatch.setenv("PROTOCOLS_IO_CALLER_TOKENS", "true")
+    fake_api.route("GET", r"/v4/protocols/\d+", lambda request: {"status_code": 0, "payload": protocol_payload(int(request.url.path.rsplit("/", 1)[1]), published=False)})
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        for token, protocol_id in (("alice", 1), ("bob", 2)):
+            async with Client(http_transport(app, {"Authorization": f"Bearer {token}"})) as client:
+                await client.call_tool("get_protocol", {"protocol_id": protocol_id})
+                response = await client.call_tool("search_local_protocols", {"query": "protocol"})
+                assert [hit["protocol_id"] for hit in response.structured_content["result"]] == [protocol_id]
+    assert [caller_of(request) for request in fake_api.requests] == ["alice", "bob"]
+
+@pytest.mark.asyncio
+async def test_requests_without_a_bearer_token_are_rejected(fake_api, monkeypatch):
+    """
+    Test that, with caller tokens enabled, a request without a bearer token is refused instead of using the server's own token.
+    """
+    monkeypatch.setattr(helpers, "PROTOCOLS_IO_CLIENT_ACCESS_TOKEN", "server-token")
+    monkeypatch.setenv("PROTOCOLS_IO_CALLER_TOKENS", "true")
+    fake_api.route("GET", "/v3/session/profile", {"status_code": 0, "user": {"username": "operator"}})
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        for headers in ({}, {"Authorization": "Basic b3BlcmF0b3I="}, {"Authorization": "Bearer "}):
+            async with Client(http_transport(app, headers)) as client:
+                response = await client.call_tool("get_my_protocols", {}, raise_on_error=False)
+            assert response.is_error
+            assert "access token is required" in response.content[0].text
+        assert fake_api.requests == []
+        # nothing is ever sent with the server's token while caller tokens are enabled
+        await helpers.access_protocols_io_resource("GET", "/v3/session/profile")
+    assert "Authorization" not in fake_api.requests[0].headers
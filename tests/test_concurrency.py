@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+from protocols_io_mcp.utils import concurrency
+
+@pytest.mark.asyncio
+async def test_gather_bounded_keeps_order_and_limit():
+    """
+    Test that results keep the input order and no more than the limit run at once.
+    """
+    in_flight = 0
+    max_in_flight = 0
+    async def work(item: int) -> int:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01 * (10 - item))
+        in_flight -= 1
+        return item * 2
+    results = await concurrency.gather_bounded(work, range(10), 3)
+    assert results == [item * 2 for item in range(10)]
+    assert max_in_flight == 3
+
+@pytest.mark.asyncio
+async def test_gather_bounded_returns_errors_per_item():
+    """
+    Test that a failing item is returned as its exception without failing the others.
+    """
+    async def work(item: int) -> int:
+        if item == 1:
+            raise ValueError("not found")
+        return item
+    results = await concurrency.gather_bounded(work, [0, 1, 2], 2)
+    assert results[0] == 0
+    assert isinstance(results[1], ValueError)
+    assert results[2] == 2
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_execution():
+    """
+    Test that concurrent calls with the same key run once and all get the result.
+    """
+    single_flight = concurrency.SingleFlight()
+    executions = 0
+    async def work() -> str:
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return "result"
+    results = await asyncio.gather(*(single_flight.do("key", work) for _ in range(5)))
+    assert results == ["result"] * 5
+    assert executions == 1
+    assert len(single_flight) == 0
+
+@pytest.mark.asyncio
+async def test_single_flight_cancelled_waiter_does_not_cancel_others():
+    """
+    Test that cancelling one caller leaves the shared execution running for the others, and that the last caller cancels it.
+    """
+    single_flight = concurrency.SingleFlight()
+    release = asyncio.Event()
+    async def work() -> str:
+        await release.wait()
+        return "result"
+    first = asyncio.create_task(single_flight.do("key", work))
+    second = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "result"
+    assert first.cancelled()
+
+    release.clear()
+    only = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    shared = single_flight._calls["key"].task
+    only.cancel()
+    await asyncio.gather(only, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert shared.cancelled()
+
+@pytest.mark.asyncio
+async def test_single_flight_retry_after_cancel_starts_a_new_execution():
+    """
+    Test that a caller arriving while a cancelled execution is still winding down gets a new execution instead of its cancellation.
+    """
+    single_flight = concurrency.SingleFlight()
+    executions = 0
+    async def work() -> int:
+        nonlocal executions
+        executions += 1
+        execution = executions
+        try:
+            await asyncio.sleep(0 if execution > 1 else 10)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.01)
+            raise
+        return execution
+    cancelled = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    assert await single_flight.do("key", work) == 2
+    await asyncio.sleep(0.02)
+    assert len(single_flight) == 0
+
+@pytest.mark.asyncio
+async def test_hedged_sends_a_duplicate_after_the_delay_and_cancels_the_loser():
+    """
+    Test that a slow call is duplicated after the delay, the faster duplicate wins and the slow call is cancelled.
+    """
+    calls = 0
+    cancelled = []
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        call = calls
+        try:
+            await asyncio.sleep(1 if call == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(call)
+            raise
+        return call
+    assert await concurrency.hedged(work, 0.01) == 2
+    await asyncio.sleep(0)
+    assert cancelled == [1]
+    assert await concurrency.hedged(work, 0.01, should_hedge=lambda: False) == 3
+
+@pytest.mark.asyncio
+async def test_hedged_waits_for_the_other_call_when_one_fails():
+    """
+    Test that a failed call does not fail the hedged call while the duplicate may still succeed, and that a fast call is not duplicated.
+    """
+    outcomes = [0.05, 0.01]
+    async def work() -> str:
+        delay = outcomes.pop(0)
+        await asyncio.sleep(delay)
+        if delay == 0.01:
+            raise ValueError("failed")
+        return "ok"
+    assert await concurrency.hedged(work, 0.01) == "ok"
+    async def fast() -> str:
+        return "fast"
+    assert await concurrency.hedged(fast, 0.01, should_hedge=lambda: pytest.fail("hedged a fast call")) == "fast"
+
+def test_recent_latencies_quantile():
+    """
+    Test that the quantile is taken from the latest latencies only.
+    """
+    latencies = concurrency.RecentLatencies(size=100)
+    assert latencies.quantile(0.95) is None
+    for value in range(1, 201):
+        latencies.add(value / 1000)
+    assert len(latencies) == 100
+    assert latencies.quantile(0.95) == pytest.approx(0.195)
+    assert latencies.quantile(0.5) == pytest.approx(0.150)
@@ -0,0 +1,352 @@
+import asyncio
+import sqlite3
+import httpx
+import pytest
+from protocols_io_mcp.utils import concurrency, helpers
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused():
+    """
+    Test that consecutive requests go through the same pooled client.
+    """
+    requested_urls = []
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested_urls.append(str(request.url))
+        return httpx.Response(200, json={"status_code": 0})
+    client = helpers.open_client(httpx.MockTransport(handler))
+    try:
+        await helpers.access_protocols_io_resource("GET", "/v3/session/profile")
+        await helpers.access_protocols_io_resource("GET", "/v4/protocols/1")
+        assert helpers.get_client() is client
+        assert requested_urls == [
+            f"{helpers.PROTOCOLS_IO_API_URL}/v3/session/profile",
+            f"{helpers.PROTOCOLS_IO_API_URL}/v4/protocols/1",
+        ]
+    finally:
+        await helpers.close_client()
+
+@pytest.mark.asyncio
+async def test_lifespan_closes_client_after_last_session():
+    """
+    Test that the shared client stays open until the last server session ends.
+    """
+    async with helpers.lifespan(None):
+        client = helpers.get_client()
+        async with helpers.lifespan(None):
+            assert helpers.get_client() is client
+        assert not client.is_closed
+    assert client.is_closed
+
+@pytest.mark.asyncio
+async def test_get_responses_are_cached_until_a_write(fake_api):
+    """
+    Test that repeated GETs are served from the cache and a write to the protocol invalidates them.
+    """
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": []})
+    fake_api.route("PUT", "/v4/protocols/1", {"status_code": 0})
+    await helpers.access_protocols_io_resource("GET", "/v4/protocols/1/steps?content_format=markdown")
+    await helpers.access_protocols_io_resource("GET", "/v4/protocols/1/steps?content_format=markdown")
+    assert len(fake_api.requests) == 1
+    await helpers.access_protocols_io_resource("PUT", "/v4/protocols/1", {"title": "New"})
+    await helpers.access_protocols_io_resource("GET", "/v4/protocols/1/steps?content_format=markdown")
+    assert [request.method for request in fake_api.requests] == ["GET", "PUT", "GET"]
+
+@pytest.mark.asyncio
+async def test_error_responses_are_not_cached(fake_api):
+    """
+    Test that responses reporting an error are fetched again.
+    """
+    await helpers.access_protocols_io_resource("GET", "/v4/protocols/404")
+    await helpers.access_protocols_io_resource("GET", "/v4/protocols/404")
+    assert len(fake_api.requests) == 2
+
+@pytest.mark.asyncio
+async def test_disk_cache_survives_restart_and_revalidates(fake_api, tmp_path, monkeypatch):
+    """
+    Test that published protocols are served from the disk cache after a restart and revalidated with their ETag once stale.
+    """
+    published = {"status_code": 0, "payload": {"id": 1, "title": "Published", "doi": "dx.doi.org/1", "published_on": 1600000000}}
+    def get_protocol(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=published, headers={"ETag": '"v1"'})
+    fake_api.route("GET", "/v4/protocols/1", get_protocol)
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": [{"guid": "a", "step": "Mix"}]})
+    helpers.configure_disk_cache(str(tmp_path))
+    try:
+        await helpers.access_protocols_io_resource("GET", "/v4/protocols/1")
+        await helpers.access_protocols_io_resource("GET", "/v4/protocols/1/steps")
+        helpers.configure_disk_cache(str(tmp_path))
+        helpers.response_cache.clear()
+        assert await helpers.access_protocols_io_resource("GET", "/v4/protocols/1") == published
+        assert (await helpers.access_protocols_io_resource("GET", "/v4/protocols/1/steps"))["payload"][0]["guid"] == "a"
+        assert len(fake_api.requests) == 2
+        monkeypatch.setattr(helpers, "PROTOCOLS_IO_DISK_CACHE_TTL", 0)
+        helpers.response_cache.clear()
+        assert await helpers.access_protocols_io_resource("GET", "/v4/protocols/1") == published
+        assert fake_api.requests[-1].headers["If-None-Match"] == '"v1"'
+    finally:
+        helpers.configure_disk_cache(None)
+
+@pytest.mark.asyncio
+async def test_disk_cache_locked_by_another_process_does_not_block_the_event_loop(fake_api, tmp_path):
+    """
+    Test that other coroutines keep running while a GET waits for the disk cache write lock held by another process.
+    """
+    published = {"status_code": 0, "payload": {"id": 1, "title": "Published", "doi": "dx.doi.org/1", "published_on": 1600000000}}
+    fake_api.route("GET", "/v4/protocols/1", published)
+    helpers.configure_disk_cache(str(tmp_path))
+    other_process = sqlite3.connect(helpers.disk_cache.path, isolation_level=None)
+    try:
+        other_process.execute("BEGIN IMMEDIATE")
+        get = asyncio.ensure_future(helpers.access_protocols_io_resource("GET", "/v4/protocols/1"))
+        ticks = 0
+        while ticks < 10:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not get.done()
+        other_process.execute("COMMIT")
+        assert await asyncio.wait_for(get, 5) == published
+        assert helpers.disk_cache.get("/v4/protocols/1") is not None
+    finally:
+        other_process.close()
+        helpers.configure_disk_cache(None)
+
+@pytest.mark.asyncio
+async def test_disk_cache_skips_unpublished_protocols(fake_api, tmp_path):
+    """
+    Test that private protocols are never written to the disk cache.
+    """
+    fake_api.route("GET", "/v4/protocols/2", {"status_code": 0, "payload": {"id": 2, "title": "Private", "doi": None, "published_on": None}})
+    fake_api.route("GET", "/v4/protocols/2/steps", {"status_code": 0, "payload": []})
+    helpers.configure_disk_cache(str(tmp_path))
+    try:
+        await helpers.access_protocols_io_resource("GET", "/v4/protocols/2")
+        await helpers.access_protocols_io_resource("GET", "/v4/protocols/2/steps")
+        assert helpers.disk_cache.get("/v4/protocols/2") is None
+        assert helpers.disk_cache.get("/v4/protocols/2/steps") is None
+    finally:
+        helpers.configure_disk_cache(None)
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_gets_share_one_request(fake_api):
+    """
+    Test that identical GETs issued at the same time make a single upstream request.
+    """
+    async def get_protocol(request: httpx.Request) -> dict:
+        await asyncio.sleep(0.01)
+        return {"status_code": 0, "payload": {"id": 1}}
+    fake_api.route("GET", "/v4/protocols/1", get_protocol)
+    results = await asyncio.gather(*(helpers.access_protocols_io_resource("GET", "/v4/protocols/1") for _ in range(5)))
+    assert all(result["payload"]["id"] == 1 for result in results)
+    assert len(fake_api.requests) == 1
+
+@pytest.mark.asyncio
+async def test_get_retries_throttled_requests_with_retry_after(fake_api, monkeypatch):
+    """
+    Test that a throttled GET is retried after the Retry-After delay and pauses the rate limiter.
+    """
+    slept = []
+    async def sleep(delay: float) -> None:
+        slept.append(delay)
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    responses = [httpx.Response(429, headers={"Retry-After": "2"}, text="Too Many Requests"), httpx.Response(200, json={"status_code": 0, "payload": {"id": 1}})]
+    fake_api.route("GET", "/v4/protocols/1", lambda request: responses.pop(0))
+    result = await helpers.access_protocols_io_resource("GET", "/v4/protocols/1")
+    assert result["payload"]["id"] == 1
+    assert len(fake_api.requests) == 2
+    assert slept[0] == 2
+    assert helpers.rate_limiter.paused_until > 0
+
+@pytest.mark.asyncio
+async def test_non_json_error_becomes_error_result(fake_api, monkeypatch):
+    """
+    Test that a non-JSON error body is returned as an API-shaped error once retries are exhausted.
+    """
+    monkeypatch.setattr(helpers, "PROTOCOLS_IO_MAX_RETRIES", 2)
+    fake_api.route("GET", "/v4/protocols/1", lambda request: httpx.Response(502, text="<html>Bad Gateway</html>"))
+    result = await helpers.access_protocols_io_resource("GET", "/v4/protocols/1")
+    assert result["status_code"] == 502
+    assert "non-JSON" in result["status_text"]
+    assert len(fake_api.requests) == 3
+
+@pytest.mark.asyncio
+async def test_writes_are_not_retried_on_server_errors(fake_api):
+    """
+    Test that a POST that may have been processed is not sent again.
+    """
+    fake_api.route("POST", "/v4/protocols/1/steps", lambda request: httpx.Response(503, text="Service Unavailable"))
+    result = await helpers.access_protocols_io_resource("POST", "/v4/protocols/1/steps", {"steps": []})
+    assert result["status_code"] == 503
+    assert len(fake_api.requests) == 1
+
+@pytest.mark.asyncio
+async def test_requests_stop_at_the_deadline(fake_api, monkeypatch):
+    """
+    Test that a request still running at the deadline is abandoned and reported as an error, without retries.
+    """
+    monkeypatch.setattr(helpers, "PROTOCOLS_IO_MAX_RETRIES", 3)
+    cancelled = asyncio.Event()
+    async def hang(request: httpx.Request) -> dict:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    fake_api.route("GET", "/v4/protocols/1", hang)
+    with helpers.deadline(0.05):
+        result = await helpers.access_protocols_io_resource("GET", "/v4/protocols/1")
+        assert helpers.remaining_time() < 0
+        assert "DeadlineExceeded" in result["error_message"]
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert len(fake_api.requests) == 1
+    assert helpers.remaining_time() is None
+
+@pytest.mark.asyncio
+async def test_retries_are_skipped_when_they_cannot_finish_before_the_deadline(fake_api, monkeypatch):
+    """
+    Test that a throttled response is returned as is when the wait before a retry would pass the deadline.
+    """
+    fake_api.route("POST", "/v4/protocols/1", lambda request: httpx.Response(429, text="Too Many Requests", headers={"Retry-After": "10"}))
+    with helpers.deadline(1):
+        result = await helpers.access_protocols_io_resource("POST", "/v4/protocols/1", {"title": "New"})
+    assert result["status_code"] == 429
+    assert len(fake_api.requests) == 1
+
+@pytest.mark.asyncio
+async def test_shared_get_is_not_bound_by_the_deadline_of_the_call_that_started_it(fake_api):
+    """
+    Test that each caller of a shared GET waits for it until its own deadline.
+    """
+    release = asyncio.Event()
+    async def slow(request: httpx.Request) -> dict:
+        await release.wait()
+        return {"payload": {"id": 1}, "status_code": 0}
+    fake_api.route("GET", "/v4/protocols/1", slow)
+    async def get(seconds: float) -> dict:
+        with helpers.deadline(seconds):
+            return await helpers.access_protocols_io_resource("GET", "/v4/protocols/1")
+    short = asyncio.create_task(get(0.05))
+    await asyncio.sleep(0)
+    long = asyncio.create_task(get(5))
+    assert "DeadlineExceeded" in (await short)["error_message"]
+    release.set()
+    assert (await long)["payload"] == {"id": 1}
+    assert len(fake_api.requests) == 1
+
+@pytest.mark.asyncio
+async def test_cancelling_a_get_cancels_its_upstream_request(fake_api):
+    """
+    Test that cancelling the only caller of a GET stops the request it was waiting for.
+    """
+    started, cancelled = asyncio.Event(), asyncio.Event()
+    async def hang(request: httpx.Request) -> dict:
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    fake_api.route("GET", "/v4/protocols/1", hang)
+    task = asyncio.ensure_future(helpers.access_protocols_io_resource("GET", "/v4/protocols/1"))
+    await started.wait()
+    task.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert len(helpers.inflight_requests) == 0
+
+@pytest.mark.asyncio
+async def test_slow_gets_are_hedged_after_the_recent_p95(fake_api, monkeypatch):
+    """
+    Test that a GET slower than the recent p95 of its endpoint gets a duplicate request, whose answer is used.
+    """
+    monkeypatch.setattr(helpers, "PROTOCOLS_IO_HEDGE_GETS", True)
+    latencies = helpers._get_latencies.setdefault(helpers.endpoint("/v4/protocols/1"), concurrency.RecentLatencies())
+    for _ in range(helpers.PROTOCOLS_IO_HEDGE_MIN_SAMPLES):
+        latencies.add(0.01)
+    delays = [10, 0]
+    async def respond(request: httpx.Request) -> dict:
+        await asyncio.sleep(delays.pop(0))
+        return {"status_code": 0, "payload": {"id": 1}}
+    fake_api.route("GET", "/v4/protocols/1", respond)
+    result = await asyncio.wait_for(helpers.access_protocols_io_resource("GET", "/v4/protocols/1"), 1)
+    assert result["payload"]["id"] == 1
+    assert len(fake_api.requests) == 2
+
+@pytest.mark.asyncio
+async def test_creating_a_protocol_does_not_invalidate_one_whose_id_prefixes_its_guid(fake_api):
+    """
+    Test that the GUID of a protocol being created is not mistaken for the ID of an existing protocol.
+    """
+    guid = "1234abcd" + "0" * 24
+    fake_api.route("GET", "/v4/protocols/1234", {"status_code": 0, "payload": {"id": 1234}})
+    fake_api.route("POST", f"/v3/protocols/{guid}", {"status_code": 0, "protocol": {"id": 5}})
+    assert helpers.resource_tags(f"/v3/protocols/{guid}") == ()
+    assert helpers.resource_tags("/v4/protocols/1234?content_format=markdown") == ("protocol:1234",)
+    await helpers.access_protocols_io_resource("GET", "/v4/protocols/1234")
+    await helpers.access_protocols_io_resource("POST", f"/v3/protocols/{guid}", {"title": "New"})
+    await helpers.access_protocols_io_resource("GET", "/v4/protocols/1234")
+    assert [request.method for request in fake_api.requests] == ["GET", "POST"]
+
+@pytest.mark.asyncio
+async def test_get_that_was_running_during_a_write_is_not_cached(fake_api):
+    """
+    Test that a response read before a write to its protocol, but received after it, does not stay in the cache.
+    """
+    version = "v1"
+    started, release = asyncio.Event(), asyncio.Event()
+    async def get_steps(request: httpx.Request) -> dict:
+        read = version
+        started.set()
+        await release.wait()
+        return {"status_code": 0, "payload": [{"step": read}]}
+    def post_step(request: httpx.Request) -> dict:
+        nonlocal version
+        version = "v2"
+        return {"status_code": 0}
+    fake_api.route("GET", "/v4/protocols/5/steps", get_steps)
+    fake_api.route("POST", "/v4/protocols/5/steps", post_step)
+    slow_get = asyncio.ensure_future(helpers.access_protocols_io_resource("GET", "/v4/protocols/5/steps"))
+    await started.wait()
+    await helpers.access_protocols_io_resource("POST", "/v4/protocols/5/steps", {"steps": []})
+    release.set()
+    assert (await slow_get)["payload"] == [{"step": "v1"}]
+    assert (await helpers.access_protocols_io_resource("GET", "/v4/protocols/5/steps"))["payload"] == [{"step": "v2"}]
+
+@pytest.mark.asyncio
+async def test_get_after_a_write_does_not_join_a_get_sent_before_it(fake_api):
+    """
+    Test that a GET issued after a write gets fresh data instead of sharing a request that was in flight during the write.
+    """
+    version = "v1"
+    started = asyncio.Event()
+    async def get_steps(request: httpx.Request) -> dict:
+        read = version
+        if read == "v1":
+            started.set()
+            await asyncio.sleep(0.05)
+        return {"status_code": 0, "payload": [{"step": read}]}
+    def post_step(request: httpx.Request) -> dict:
+        nonlocal version
+        version = "v2"
+        return {"status_code": 0}
+    fake_api.route("GET", "/v4/protocols/5/steps", get_steps)
+    fake_api.route("POST", "/v4/protocols/5/steps", post_step)
+    slow_get = asyncio.ensure_future(helpers.access_protocols_io_resource("GET", "/v4/protocols/5/steps"))
+    await started.wait()
+    await helpers.access_protocols_io_resource("POST", "/v4/protocols/5/steps", {"steps": []})
+    read_after_write = await helpers.access_protocols_io_resource("GET", "/v4/protocols/5/steps")
+    assert read_after_write["payload"] == [{"step": "v2"}]
+    assert (await slow_get)["payload"] == [{"step": "v1"}]
+    assert (await helpers.access_protocols_io_resource("GET", "/v4/protocols/5/steps"))["payload"] == [{"step": "v2"}]
+    assert [request.method for request in fake_api.requests] == ["GET", "POST", "GET"]
+
+@pytest.mark.asyncio
+async def test_private_cache_hits_are_not_counted_as_shared_cache_misses(fake_api):
+    """
+    Test that each cached GET counts once, as a hit of the cache that answered it or as a single miss.
+    """
+    fake_api.route("GET", "/v4/protocols/1", {"status_code": 0, "payload": {"id": 1, "doi": None, "published_on": None}})
+    for _ in range(3):
+        await helpers.access_protocols_io_resource("GET", "/v4/protocols/1")
+    assert (helpers.response_cache.hits, helpers.response_cache.misses) == (0, 1)
+    assert (helpers.private_cache.hits, helpers.private_cache.misses) == (2, 0)
@@ -0,0 +1,80 @@
+import pytest
+from fastmcp import Client
+from protocols_io_mcp.server import mcp, prometheus_metrics
+from protocols_io_mcp.utils import helpers
+from protocols_io_mcp.utils.metrics import Metrics, Histogram
+
+@pytest.fixture
+def enabled_metrics():
+    helpers.metrics.reset()
+    helpers.metrics.enabled = True
+    yield helpers.metrics
+    helpers.metrics.enabled = False
+    helpers.metrics.reset()
+
+def test_histogram_buckets_are_cumulative():
+    """
+    Test that histogram buckets count every value up to their bound.
+    """
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.count == 4 and histogram.sum == pytest.approx(5.65)
+
+def test_disabled_metrics_record_nothing():
+    """
+    Test that nothing is recorded while metrics are disabled.
+    """
+    metrics = Metrics()
+    metrics.increment("calls_total")
+    metrics.observe("duration_seconds", 1.0)
+    metrics.record_upstream("GET", "/v4/protocols/{id}", "200", 0.1, 0, 10)
+    assert metrics.timed("parse")(lambda: 1)() == 1
+    assert metrics.snapshot()["counters"] == {} and metrics.snapshot()["histograms"] == {}
+
+def test_render_prometheus_text():
+    """
+    Test the Prometheus text format of counters, histograms and gauges.
+    """
+    metrics = Metrics(enabled=True)
+    metrics.increment("protocols_io_tool_calls_total", tool="get_protocol", outcome="ok")
+    metrics.observe("protocols_io_tool_duration_seconds", 0.2, buckets=(0.1, 1.0), tool="get_protocol")
+    text = metrics.render({"protocols_io_cache_hit_ratio": 0.5})
+    assert '# TYPE protocols_io_tool_calls_total counter' in text
+    assert 'protocols_io_tool_calls_total{outcome="ok",tool="get_protocol"} 1' in text
+    assert 'protocols_io_tool_duration_seconds_bucket{tool="get_protocol",le="1"} 1' in text
+    assert 'protocols_io_tool_duration_seconds_count{tool="get_protocol"} 1' in text
+    assert 'protocols_io_cache_hit_ratio 0.5' in text
+
+def test_endpoint_labels():
+    """
+    Test that metric endpoint labels do not contain IDs, GUIDs, usernames or query strings.
+    """
+    assert helpers.endpoint("/v4/protocols/123/steps?content_format=markdown") == "/v4/protocols/{id}/steps"
+    assert helpers.endpoint(f"/v3/protocols/{'a' * 32}") == "/v3/protocols/{id}"
+    assert helpers.endpoint("/v3/researchers/jane/protocols?filter=user_all") == "/v3/researchers/{username}/protocols"
+
+@pytest.mark.asyncio
+async def test_tool_calls_are_measured(fake_api, enabled_metrics):
+    """
+    Test that a tool call records its duration, upstream requests, statuses, bytes and step parsing, and that the metrics are served.
+    """
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": [{"guid": "g1", "step": "Mix"}, {"guid": "g2", "step": "Spin"}]})
+    async with Client(mcp) as client:
+        await client.call_tool("get_protocol_steps", {"protocol_id": 1})
+        await client.call_tool("get_protocol_steps", {"protocol_id": 1})
+        resource = await client.read_resource("metrics://protocols-io")
+    assert '"protocols_io_tool_calls_total"' in resource[0].text
+    snapshot = enabled_metrics.snapshot()
+    [upstream] = snapshot["histograms"]["protocols_io_tool_upstream_requests"]
+    # the second call is served from the cache
+    assert upstream["count"] == 2 and upstream["sum"] == 1
+    [requests] = snapshot["counters"]["protocols_io_upstream_requests_total"]
+    assert requests == {"labels": {"endpoint": "/v4/protocols/{id}/steps", "method": "GET", "status": "200"}, "value": 1}
+    assert any(series["labels"]["direction"] == "received" and series["value"] > 0 for series in snapshot["counters"]["protocols_io_upstream_bytes_total"])
+    # both calls parse both steps
+    assert snapshot["counters"]["protocols_io_step_parse_calls_total"][0]["value"] == 4
+    response = await prometheus_metrics(None)
+    assert b'protocols_io_tool_calls_total{outcome="ok",tool="get_protocol_steps"} 2' in response.body
+    assert b"# TYPE protocols_io_cache_hit_ratio gauge" in response.body
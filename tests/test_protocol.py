@@ -0,0 +1,284 @@
+import json
+import asyncio
+import pytest
+from fastmcp import Client
+from protocols_io_mcp.server import mcp
+from protocols_io_mcp.utils import helpers
+from protocols_io_mcp.tools.protocol import Material, Protocol, ProtocolStep, ProtocolStepInput, ErrorMessage
+
+def protocol_payload(protocol_id: int, **fields) -> dict:
+    return {
+        "id": protocol_id,
+        "title": f"Protocol {protocol_id}",
+        "description": "Description",
+        "doi": None,
+        "url": f"https://www.protocols.io/view/{protocol_id}",
+        "created_on": 1600000000,
+        "published_on": None,
+        **fields
+    }
+
+@pytest.mark.asyncio
+async def test_from_listing_only_fetches_incomplete_items(fake_api):
+    """
+    Test that listing items with every needed field are used as-is and only incomplete items are fetched.
+    """
+    incomplete = protocol_payload(2)
+    del incomplete["created_on"]
+    fake_api.route("GET", "/v4/protocols/2", {"status_code": 0, "payload": protocol_payload(2, title="Fetched")})
+    protocols = await Protocol.from_listing([protocol_payload(1), incomplete, protocol_payload(3)])
+    assert [protocol.title for protocol in protocols] == ["Protocol 1", "Fetched", "Protocol 3"]
+    assert len(fake_api.requests) == 1
+
+@pytest.mark.asyncio
+async def test_from_listing_reports_failed_fetch_per_item(fake_api):
+    """
+    Test that an incomplete item that cannot be fetched is reported in its own slot.
+    """
+    protocols = await Protocol.from_listing([{"id": 7}, protocol_payload(8)])
+    assert isinstance(protocols[0], ErrorMessage)
+    assert protocols[1].id == 8
+
+@pytest.mark.asyncio
+async def test_get_protocol_uses_single_request(fake_api):
+    """
+    Test that get_protocol builds its result from one upstream request.
+    """
+    fake_api.route("GET", "/v4/protocols/1", {"status_code": 0, "payload": protocol_payload(1)})
+    async with Client(mcp) as client:
+        response = await client.call_tool("get_protocol", {"protocol_id": 1})
+    assert response.structured_content["result"]["title"] == "Protocol 1"
+    assert len(fake_api.requests) == 1
+
+@pytest.mark.asyncio
+async def test_create_protocol_reads_back_once(fake_api):
+    """
+    Test that create_protocol makes a single read-after-write fetch.
+    """
+    fake_api.route("POST", r"/v3/protocols/\w+", {"status_code": 0, "protocol": {"id": 5}})
+    fake_api.route("PUT", "/v4/protocols/5", {"status_code": 0})
+    fake_api.route("GET", "/v4/protocols/5", {"status_code": 0, "payload": protocol_payload(5, title="New", description="Created")})
+    async with Client(mcp) as client:
+        response = await client.call_tool("create_protocol", {"title": "New", "description": "Created"})
+    assert response.structured_content["result"]["title"] == "New"
+    assert [request.method for request in fake_api.requests] == ["POST", "PUT", "GET"]
+
+def existing_steps(*descriptions: str) -> list[ProtocolStep]:
+    return [ProtocolStep(id=f"guid-{description}", description=description) for description in descriptions]
+
+def test_diff_updates_changed_step_in_place():
+    """
+    Test that changing one step updates only that step and keeps every GUID.
+    """
+    plan = ProtocolStep.diff(existing_steps("a", "b", "c"), ["a\n", "B\n", "c\n"])
+    assert plan["steps"] == [{"guid": "guid-b", "previous_guid": "guid-a", "step": "B\n"}]
+    assert plan["deleted"] == []
+    assert (plan["inserted"], plan["updated"], plan["unchanged"]) == (0, 1, 2)
+
+def test_diff_inserts_and_deletes_with_relinking():
+    """
+    Test that inserted steps get new GUIDs, removed steps are deleted and steps whose predecessor changed are relinked.
+    """
+    plan = ProtocolStep.diff(existing_steps("a", "b", "c", "d"), ["a\n", "new\n", "b\n", "d\n"])
+    assert plan["deleted"] == ["guid-c"]
+    inserted = plan["steps"][0]
+    assert inserted["previous_guid"] == "guid-a" and inserted["step"] == "new\n"
+    assert plan["steps"][1:] == [
+        {"guid": "guid-b", "previous_guid": inserted["guid"], "step": "b\n"},
+        {"guid": "guid-d", "previous_guid": "guid-b", "step": "d\n"},
+    ]
+    assert (plan["inserted"], plan["updated"], plan["unchanged"]) == (1, 2, 1)
+
+def test_diff_without_changes_writes_nothing():
+    """
+    Test that setting identical steps plans no writes.
+    """
+    plan = ProtocolStep.diff(existing_steps("a", "b"), ["a\n", "b\n"])
+    assert plan["steps"] == [] and plan["deleted"] == []
+
+@pytest.mark.asyncio
+async def test_set_protocol_steps_sends_only_changes(fake_api):
+    """
+    Test that set_protocol_steps posts only the changed step and skips the delete.
+    """
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": [{"guid": "g1", "step": "Mix"}, {"guid": "g2", "step": "Spin"}]})
+    fake_api.route("POST", "/v4/protocols/1/steps", {"status_code": 0})
+    async with Client(mcp) as client:
+        response = await client.call_tool("set_protocol_steps", {"protocol_id": 1, "steps": [{"description": "Mix"}, {"description": "Spin twice"}]})
+    result = response.structured_content["result"]
+    assert (result["inserted"], result["updated"], result["deleted"], result["unchanged"]) == (0, 1, 0, 1)
+    assert [request.method for request in fake_api.requests] == ["GET", "POST", "GET"]
+    assert json.loads(fake_api.requests[1].content)["steps"] == [{"guid": "g2", "previous_guid": "g1", "step": "Spin twice\n"}]
+
+@pytest.mark.asyncio
+async def test_resolve_references_fetches_each_protocol_once(fake_api):
+    """
+    Test that references shared between steps are resolved with one request per protocol.
+    """
+    fake_api.route("GET", "/v4/protocols/5", {"status_code": 0, "payload": protocol_payload(5, doi="dx.doi.org/5")})
+    fake_api.route("GET", "/v4/protocols/6", {"status_code": 0, "payload": protocol_payload(6, title="A [draft]")})
+    steps = [ProtocolStepInput(description="Mix", reference_protocol_ids=[5, 6]), ProtocolStepInput(description="Spin", reference_protocol_ids=[6, 5])]
+    references = await ProtocolStepInput.resolve_references(steps)
+    assert sorted(references) == [5, 6]
+    assert len(fake_api.requests) == 2
+    assert ProtocolStepInput.to_string(steps[1], references) == "Spin\n\n[Protocol References]\n- A <draft>[6] None\n- Protocol 5[5] dx.doi.org/5\n"
+
+@pytest.mark.asyncio
+async def test_resolve_references_reports_all_invalid_ids(fake_api):
+    """
+    Test that every invalid reference is reported in a single error.
+    """
+    fake_api.route("GET", "/v4/protocols/5", {"status_code": 0, "payload": protocol_payload(5)})
+    steps = [ProtocolStepInput(description="Mix", reference_protocol_ids=[5, 8]), ProtocolStepInput(description="Spin", reference_protocol_ids=[9])]
+    error = await ProtocolStepInput.resolve_references(steps)
+    assert isinstance(error, ErrorMessage)
+    assert "protocol 8" in error.error_message and "protocol 9" in error.error_message
+
+def test_parse_round_trips_rendered_steps():
+    """
+    Test that parsing the content rendered by ProtocolStepInput.to_string gives back the step.
+    """
+    references = {5: Protocol.from_api_response(protocol_payload(5, title="Prep [v2] 10", doi="dx.doi.org/5")), 6: Protocol.from_api_response(protocol_payload(6))}
+    steps = [
+        ProtocolStepInput(description="Mix the buffer"),
+        ProtocolStepInput(description="Line one\nLine two", materials=[Material(name="Tris HCl", quantity=1.5, unit="m L"), Material(name="NaCl", quantity=0, unit="g")]),
+        ProtocolStepInput(description="Spin", reference_protocol_ids=[5, 6]),
+        ProtocolStepInput(description="Incubate", materials=[Material(name="Taq", quantity=2, unit="μL")], reference_protocol_ids=[6]),
+    ]
+    for step in steps:
+        parsed = ProtocolStep.parse(ProtocolStepInput.to_string(step, references))
+        assert parsed["description"] == step.description
+        assert parsed["materials"] == [{"name": material.name.replace(" ", "_"), "quantity": material.quantity, "unit": material.unit.replace(" ", "_")} for material in step.materials]
+        assert parsed["reference_protocol_ids"] == step.reference_protocol_ids
+
+def test_parse_skips_malformed_lines():
+    """
+    Test that malformed material and reference lines are skipped instead of failing the step.
+    """
+    parsed = ProtocolStep.parse("Mix\n\n[Materials]\n- Tris\n- NaCl lots g\n- Water 5 mL\n[Protocol References]\n- Untitled[abc] None\n- Prep[12] None\nAfterwards")
+    assert parsed["description"] == "Mix\nAfterwards"
+    assert parsed["materials"] == [{"name": "Water", "quantity": 5.0, "unit": "mL"}]
+    assert parsed["reference_protocol_ids"] == [12]
+    assert ProtocolStep.from_api_response({"guid": "g", "step": None}).description == ""
+
+@pytest.mark.asyncio
+async def test_get_protocol_steps_pages_and_projects(fake_api):
+    """
+    Test that get_protocol_steps returns the requested page and can reduce steps to a summary.
+    """
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": [{"guid": f"g{index}", "step": f"Step {index} title\nDetails\n\n[Materials]\n- Water 1 mL\n"} for index in range(10)]})
+    async with Client(mcp) as client:
+        response = await client.call_tool("get_protocol_steps", {"protocol_id": 1, "offset": 8, "limit": 5})
+        page = response.structured_content["result"]
+        assert page["total_steps"] == 10 and page["offset"] == 8
+        assert [step["id"] for step in page["steps"]] == ["g8", "g9"]
+        assert page["steps"][0]["materials"] == [{"name": "Water", "quantity": 1.0, "unit": "mL"}]
+        response = await client.call_tool("get_protocol_steps", {"protocol_id": 1, "limit": 1, "summary": True, "max_description_length": 7})
+        assert response.structured_content["result"]["steps"] == [{"id": "g0", "description": "Step 0…"}]
+        for max_length in (1, 6, 12, 20):
+            response = await client.call_tool("get_protocol_steps", {"protocol_id": 1, "limit": 1, "max_description_length": max_length})
+            assert len(response.structured_content["result"]["steps"][0]["description"]) <= max_length
+
+@pytest.mark.asyncio
+async def test_get_my_protocols_summary(fake_api):
+    """
+    Test that the summary of get_my_protocols lists IDs and titles from the listing alone.
+    """
+    fake_api.route("GET", "/v3/session/profile", {"status_code": 0, "user": {"username": "me", "name": "Me", "affiliation": None}})
+    fake_api.route("GET", "/v3/researchers/me/protocols", {"status_code": 0, "items": [{"id": 1, "title": "First"}, {"id": 2, "title": "Second"}]})
+    async with Client(mcp) as client:
+        response = await client.call_tool("get_my_protocols", {"summary": True})
+    assert response.structured_content["result"] == [{"id": 1, "title": "First"}, {"id": 2, "title": "Second"}]
+    assert len(fake_api.requests) == 2
+
+@pytest.mark.asyncio
+async def test_search_fetches_several_pages_and_prefetches_next(fake_api):
+    """
+    Test that several pages are returned at once and the following pages are answered from the prefetched results.
+    """
+    def search(request):
+        page = int(request.url.params["page_id"]) + 1
+        page_size = int(request.url.params["page_size"])
+        items = [protocol_payload(page * 100 + index) for index in range(page_size)]
+        return {"status_code": 0, "items": items, "pagination": {"current_page": page, "total_pages": 4}}
+    fake_api.route("GET", "/v3/protocols", search)
+    async with Client(mcp) as client:
+        response = await client.call_tool("search_public_protocols", {"keyword": "dna & rna", "page_size": 2, "pages": 2})
+        result = response.structured_content["result"]
+        assert [protocol["id"] for protocol in result["protocols"]] == [100, 101, 200, 201]
+        assert result["current_page"] == 2 and result["total_pages"] == 4
+        await asyncio.sleep(0.01)
+        assert len(fake_api.requests) == 4
+        assert fake_api.requests[0].url.params["key"] == "dna & rna"
+        response = await client.call_tool("search_public_protocols", {"keyword": "dna & rna", "page": 3, "page_size": 2, "pages": 2})
+        assert response.structured_content["result"]["current_page"] == 4
+    assert len(fake_api.requests) == 4
+
+@pytest.mark.asyncio
+async def test_search_returns_the_new_title_after_an_update(fake_api):
+    """
+    Test that updating a protocol drops cached search pages, so neither the search nor the local index keep the old title.
+    """
+    current = protocol_payload(1, title="Gibson assembly")
+    def update(request):
+        current.update(json.loads(request.content))
+        return {"status_code": 0}
+    fake_api.route("GET", "/v3/protocols", lambda request: {"status_code": 0, "items": [dict(current)], "pagination": {"current_page": 1, "total_pages": 1}})
+    fake_api.route("PUT", "/v4/protocols/1", update)
+    fake_api.route("GET", "/v4/protocols/1", lambda request: {"status_code": 0, "payload": dict(current)})
+    async with Client(mcp) as client:
+        response = await client.call_tool("search_public_protocols", {"keyword": "assembly", "pages": 1})
+        assert response.structured_content["result"]["protocols"][0]["title"] == "Gibson assembly"
+        await client.call_tool("update_protocol_title", {"protocol_id": 1, "title": "Golden Gate assembly"})
+        response = await client.call_tool("search_public_protocols", {"keyword": "assembly", "pages": 1})
+        assert response.structured_content["result"]["protocols"][0]["title"] == "Golden Gate assembly"
+        response = await client.call_tool("search_local_protocols", {"query": "assembly"})
+    assert [hit["title"] for hit in response.structured_content["result"]] == ["Golden Gate assembly"]
+
+@pytest.mark.asyncio
+async def test_search_local_protocols_finds_retrieved_data_offline(fake_api):
+    """
+    Test that protocols and steps retrieved earlier can be searched without upstream requests.
+    """
+    fake_api.route("GET", "/v4/protocols/1", {"status_code": 0, "payload": protocol_payload(1, title="Gibson assembly")})
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": [{"guid": "g1", "step": "Mix fragments\n\n[Materials]\n- Gibson_master_mix 10 μL\n"}]})
+    async with Client(mcp) as client:
+        await client.call_tool("get_protocol", {"protocol_id": 1})
+        await client.call_tool("get_protocol_steps", {"protocol_id": 1})
+        requests = len(fake_api.requests)
+        response = await client.call_tool("search_local_protocols", {"query": "master mix"})
+    assert response.structured_content["result"][0]["protocol_id"] == 1
+    assert response.structured_content["result"][0]["title"] == "Gibson assembly"
+    assert response.structured_content["result"][0]["step_ids"] == ["g1"]
+    assert len(fake_api.requests) == requests
+
+@pytest.mark.asyncio
+async def test_batch_tools_report_errors_per_id(fake_api):
+    """
+    Test that the batch tools return one result per ID in order, with errors reported per ID.
+    """
+    fake_api.route("GET", "/v4/protocols/1", {"status_code": 0, "payload": protocol_payload(1)})
+    fake_api.route("GET", "/v4/protocols/1/steps", {"status_code": 0, "payload": [{"guid": "g1", "step": "Mix"}]})
+    async with Client(mcp) as client:
+        response = await client.call_tool("get_protocols_batch", {"protocol_ids": [1, 2]})
+        protocols = response.structured_content["result"]
+        assert protocols[0]["id"] == 1 and "error_message" in protocols[1]
+        response = await client.call_tool("get_protocol_steps_batch", {"protocol_ids": [2, 1], "summary": True})
+        steps = response.structured_content["result"]
+        assert "protocol 2" in steps[0]["error_message"]
+        assert steps[1] == {"protocol_id": 1, "steps": [{"id": "g1", "description": "Mix"}]}
+        response = await client.call_tool("get_protocols_batch", {"protocol_ids": list(range(100))})
+        assert "error_message" in response.structured_content["result"]
+
+@pytest.mark.asyncio
+async def test_tool_calls_return_an_error_at_their_deadline(fake_api, monkeypatch):
+    """
+    Test that a tool call whose upstream request hangs returns an error once PROTOCOLS_IO_TOOL_TIMEOUT has passed.
+    """
+    monkeypatch.setattr(helpers, "PROTOCOLS_IO_TOOL_TIMEOUT", 0.05)
+    async def hang(request):
+        await asyncio.sleep(10)
+    fake_api.route("GET", "/v4/protocols/1", hang)
+    async with Client(mcp) as client:
+        response = await asyncio.wait_for(client.call_tool("get_protocol", {"protocol_id": 1}), 2)
+    assert "deadline" in response.structured_content["result"]["error_message"]
@@ -0,0 +1,59 @@
+import time
+import pytest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from protocols_io_mcp.utils.ratelimit import TokenBucket, backoff_delay, parse_retry_after
+
+def test_token_bucket_allows_burst_then_spaces_requests(monkeypatch):
+    """
+    Test that a full bucket serves a burst immediately and then one request per 1/rate seconds.
+    """
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+    monkeypatch.setattr(time, "monotonic", lambda: now + 1)
+    assert bucket.reserve() == 0.0
+
+def test_token_bucket_pause_holds_back_every_caller(monkeypatch):
+    """
+    Test that pausing the bucket delays callers even when tokens are available.
+    """
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    bucket = TokenBucket(rate=0, burst=1)
+    assert bucket.reserve() == 0.0
+    bucket.pause(2)
+    assert bucket.reserve() == pytest.approx(2)
+
+def test_backoff_delay_is_capped():
+    """
+    Test that the jittered backoff never exceeds the exponential bound or the cap.
+    """
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, 0.5, 4) <= min(4, 0.5 * 2 ** attempt)
+
+def test_parse_retry_after():
+    """
+    Test that Retry-After is understood both as seconds and as an HTTP date.
+    """
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= parse_retry_after(retry_at) <= 30
+
+@pytest.mark.asyncio
+async def test_token_bucket_gives_up_without_taking_a_token(monkeypatch):
+    """
+    Test that acquire with a timeout and try_acquire return False, keeping the token, when it is not available in time.
+    """
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    bucket = TokenBucket(rate=10, burst=1)
+    assert await bucket.acquire(timeout=0)
+    assert not bucket.try_acquire()
+    assert not await bucket.acquire(timeout=0.05)
+    assert bucket.reserve() == pytest.approx(0.1)
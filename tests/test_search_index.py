@@ -0,0 +1,31 @@
+from protocols_io_mcp.utils.search_index import SearchIndex
+
+def test_search_ranks_protocols_and_lists_matching_steps():
+    """
+    Test that protocols are ranked by relevance and matching steps are listed under their protocol.
+    """
+    index = SearchIndex(max_protocols=10)
+    index.add_protocol(1, "Plasmid DNA miniprep", "Extract plasmid DNA from E. coli")
+    index.add_protocol(2, "RNA extraction", "Trizol based extraction")
+    index.add_steps(2, [("s1", "Add Trizol and vortex Trizol_reagent"), ("s2", "Centrifuge at 12000 g")])
+    hits = index.search("plasmid")
+    assert [hit.protocol_id for hit in hits] == [1]
+    hits = index.search("trizol centrifuge")
+    assert hits[0].protocol_id == 2
+    assert set(hits[0].step_ids) == {"s1", "s2"}
+    assert index.search("") == []
+
+def test_reindexing_replaces_documents_and_evicts_oldest():
+    """
+    Test that re-indexed steps replace old ones and the least recently indexed protocol is evicted.
+    """
+    index = SearchIndex(max_protocols=2)
+    index.add_steps(1, [("a", "old buffer"), ("b", "spin")])
+    index.add_steps(1, [("a", "new buffer")], replace=True)
+    assert index.search("old") == []
+    assert index.search("spin") == []
+    assert index.search("new")[0].step_ids == ["a"]
+    index.add_protocol(2, "Second", "")
+    index.add_protocol(3, "Third", "")
+    assert len(index) == 2
+    assert index.search("buffer") == []
@@ -0,0 +1,45 @@
+import json
+import pytest
+from fastmcp import FastMCP
+from protocols_io_mcp import tool_schemas
+from protocols_io_mcp.server import mcp
+
+@pytest.mark.asyncio
+async def test_precomputed_schemas_are_current():
+    """
+    Test that the committed tool schemas match the tools, regenerate them with python -m protocols_io_mcp.tool_schemas if this fails.
+    """
+    with open(tool_schemas.SCHEMAS_PATH) as file:
+        cached = json.load(file)
+    assert cached["fingerprint"] == tool_schemas.fingerprint()
+    assert cached["tools"] == await tool_schemas.generate(mcp)
+
+@pytest.mark.asyncio
+async def test_register_with_and_without_precomputed_schemas(tmp_path):
+    """
+    Test that a tool registered from precomputed schemas is listed exactly like one generated from its function, and that stale schemas are ignored.
+    """
+    async def double(value: int) -> int:
+        """Double a value."""
+        return value * 2
+
+    generated = FastMCP("generated")
+    tool_schemas.register(generated, double, {})
+    schemas = await tool_schemas.generate(generated)
+    precomputed = FastMCP("precomputed")
+    tool = tool_schemas.register(precomputed, double, schemas)
+    assert tool.to_mcp_tool() == (await generated.get_tool("double")).to_mcp_tool()
+    path = tmp_path / "schemas.json"
+    path.write_text(json.dumps({"fingerprint": "stale", "tools": schemas}))
+    assert tool_schemas.load(str(path)) == {}
+
+def test_fingerprint_only_changes_with_major_library_versions(monkeypatch):
+    """
+    Test that installs resolving newer minor releases of fastmcp and pydantic keep using the precomputed schemas.
+    """
+    current = tool_schemas.fingerprint()
+    monkeypatch.setattr(tool_schemas.fastmcp, "__version__", tool_schemas.fastmcp.__version__.split(".")[0] + ".99.0")
+    monkeypatch.setattr(tool_schemas.pydantic, "VERSION", tool_schemas.pydantic.VERSION.split(".")[0] + ".99.0")
+    assert tool_schemas.fingerprint() == current
+    monkeypatch.setattr(tool_schemas.fastmcp, "__version__", "99.0.0")
+    assert tool_schemas.fingerprint() != current